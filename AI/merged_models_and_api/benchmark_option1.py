@@ -0,0 +1,86 @@
+"""
+Time and peak memory of enhance_image_option1: legacy PIL/OpenCV chain vs. fused kernel.
+
+Each variant runs in a fresh process so peak RSS is not shared between them.
+
+    python benchmark_option1.py [image_path] [--runs 5]
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import statistics
+import time
+import cv2
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter
+import fused_enhancement
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_IMAGE = os.path.join(script_dir, "..", "..", "frontend", "public", "sample1.jpg")
+
+
+def legacy_option1(image):
+    """The original chain from process_image.enhance_image_option1."""
+    sharpened = image.filter(ImageFilter.UnsharpMask(radius=1, percent=120, threshold=1))
+    contrast_enhanced = ImageEnhance.Contrast(sharpened).enhance(1.1)
+    brightness_enhanced = ImageEnhance.Brightness(contrast_enhanced).enhance(1.02)
+    color_enhanced = ImageEnhance.Color(brightness_enhanced).enhance(1.05)
+    img_array = np.array(color_enhanced)
+    img_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+    denoised = cv2.bilateralFilter(img_bgr, 3, 10, 10)
+    img_rgb = cv2.cvtColor(denoised, cv2.COLOR_BGR2RGB)
+    enhanced = Image.fromarray(img_rgb)
+    new_size = (int(enhanced.size[0] * 1.5), int(enhanced.size[1] * 1.5))
+    return enhanced.resize(new_size, Image.Resampling.LANCZOS)
+
+
+VARIANTS = {
+    "legacy": legacy_option1,
+    "fused": fused_enhancement.enhance_option1,
+}
+
+
+def _measure(variant, image_path, runs, results):
+    image = Image.open(image_path).convert("RGB")
+    image.load()
+    # ru_maxrss is reported in kilobytes on Linux
+    peak_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        VARIANTS[variant](image)
+        timings.append(time.perf_counter() - start)
+    peak_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    results[variant] = (statistics.median(timings), peak_after - peak_before)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image_path", nargs="?", default=DEFAULT_IMAGE)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    image = Image.open(args.image_path).convert("RGB")
+    print(f"Image: {args.image_path} ({image.size[0]}x{image.size[1]})")
+
+    manager = multiprocessing.Manager()
+    results = manager.dict()
+    for variant in VARIANTS:
+        process = multiprocessing.Process(target=_measure, args=(variant, args.image_path, args.runs, results))
+        process.start()
+        process.join()
+
+    for variant in VARIANTS:
+        seconds, peak_bytes = results[variant]
+        print(f"{variant:<8} median {seconds * 1000:8.1f} ms   peak extra RSS {peak_bytes / 2**20:8.1f} MB")
+
+    legacy = np.asarray(legacy_option1(image), dtype=np.int16)
+    fused = np.asarray(fused_enhancement.enhance_option1(image), dtype=np.int16)
+    difference = np.abs(legacy - fused)
+    print(f"Pixel difference vs legacy: mean {difference.mean():.2f}, "
+          f"99th percentile {np.percentile(difference, 99):.0f} (0-255 scale)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Accuracy and latency comparison of the OwlViT detection engines.
+
+Runs every image in frontend/public through the torch, ONNX and INT8 ONNX
+engines and compares the boxes/labels each engine returns against torch.
+
+    python compare_detection_engines.py [--runs 5] [--engines torch onnx onnx-int8]
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+from PIL import Image
+import detection_vocabulary
+import model_registry
+import object_detector
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_DIR = os.path.join(script_dir, "..", "..", "frontend", "public")
+
+
+def box_iou(box_a, box_b):
+    x1, y1 = max(box_a[0], box_b[0]), max(box_a[1], box_b[1])
+    x2, y2 = min(box_a[2], box_b[2]), min(box_a[3], box_b[3])
+    intersection = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    area_a = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1])
+    area_b = (box_b[2] - box_b[0]) * (box_b[3] - box_b[1])
+    union = area_a + area_b - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def match_score(reference, candidate):
+    """Mean best-IoU of reference boxes against candidate boxes with the same label."""
+    ref_boxes, ref_labels = reference
+    cand_boxes, cand_labels = candidate
+    if not ref_boxes:
+        return 1.0 if not cand_boxes else 0.0
+    ious = []
+    for ref_box, ref_label in zip(ref_boxes, ref_labels):
+        same_label = [box for box, label in zip(cand_boxes, cand_labels) if label == ref_label]
+        ious.append(max((box_iou(ref_box, box) for box in same_label), default=0.0))
+    return sum(ious) / len(ious)
+
+
+def run_engine(engine, pixel_values, image_size, labels, queries, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        outputs = object_detector.predict(pixel_values, queries, engine=engine)
+        timings.append(time.perf_counter() - start)
+    _, valid_boxes, detected_labels = object_detector.collect_boxes(outputs, image_size, labels)
+    return statistics.median(timings), (valid_boxes, detected_labels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--engines", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    args = parser.parse_args()
+
+    image_paths = sorted(
+        path for pattern in ("*.jpg", "*.jpeg", "*.png")
+        for path in glob.glob(os.path.join(SAMPLE_DIR, pattern))
+    )
+    if not image_paths:
+        print(f"No sample images found in {SAMPLE_DIR}")
+        return
+
+    processor, _ = model_registry.get_owlvit()
+    labels = detection_vocabulary.DEFAULT_LABELS
+    queries = object_detector.query_cache.get(labels)
+
+    # Warm up every engine once (includes ONNX export / quantization on first run)
+    warmup = processor(images=Image.open(image_paths[0]).convert("RGB"), return_tensors="pt")["pixel_values"]
+    for engine in args.engines:
+        object_detector.predict(warmup, queries, engine=engine)
+
+    latencies = {engine: [] for engine in args.engines}
+    agreement = {engine: [] for engine in args.engines}
+
+    print(f"{'image':<24}" + "".join(f"{engine:>22}" for engine in args.engines))
+    for path in image_paths:
+        image = Image.open(path).convert("RGB")
+        pixel_values = processor(images=image, return_tensors="pt")["pixel_values"]
+
+        results = {}
+        for engine in args.engines:
+            results[engine] = run_engine(engine, pixel_values, image.size, labels, queries, args.runs)
+
+        reference = results["torch"][1] if "torch" in results else None
+        row = f"{os.path.basename(path)[:23]:<24}"
+        for engine in args.engines:
+            latency, detections = results[engine]
+            latencies[engine].append(latency)
+            score = match_score(reference, detections) if reference else float("nan")
+            agreement[engine].append(score)
+            row += f"{latency * 1000:>10.1f} ms IoU {score:.2f}"
+        print(row)
+
+    print()
+    for engine in args.engines:
+        print(f"{engine:<10} median latency {statistics.median(latencies[engine]) * 1000:8.1f} ms, "
+              f"mean IoU vs torch {statistics.mean(agreement[engine]):.3f}")
+
+
+if __name__ == "__main__":
+    main()
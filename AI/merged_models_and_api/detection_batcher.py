@@ -0,0 +1,125 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+import torch
+from transformers.models.owlvit.modeling_owlvit import OwlViTObjectDetectionOutput
+import object_detector
+
+DETECTION_BATCH_WINDOW_MS = float(os.getenv("DETECTION_BATCH_WINDOW_MS", "20"))
+DETECTION_MAX_BATCH = int(os.getenv("DETECTION_MAX_BATCH", "8"))
+
+
+class _PendingDetection:
+    def __init__(self, pixel_values, queries):
+        self.pixel_values = pixel_values
+        self.queries = queries
+        self.enqueued_at = time.perf_counter()
+        self.future = Future()
+
+
+class DetectionBatcher:
+    """
+    Collects detection requests from concurrent process_image instances and runs
+    them through OwlViT as one batch.
+    A batch closes when it holds max_batch_size images or when its oldest request
+    has waited window_ms, so no request queues longer than the window.
+    """
+
+    def __init__(self, window_ms=DETECTION_BATCH_WINDOW_MS, max_batch_size=DETECTION_MAX_BATCH):
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self.batch_sizes = Counter()
+        self.images = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="detection-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, pixel_values, queries) -> Future:
+        """Queues one preprocessed image; the future resolves to its own detection output."""
+        self._ensure_started()
+        pending = _PendingDetection(pixel_values, queries)
+        self._queue.put(pending)
+        return pending.future
+
+    def detect(self, pixel_values, queries) -> OwlViTObjectDetectionOutput:
+        return self.submit(pixel_values, queries).result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueued_at + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started_at = time.perf_counter()
+            self._record(batch, started_at)
+
+            # Requests with different vocabularies cannot share a class head pass
+            groups = {}
+            for pending in batch:
+                groups.setdefault(pending.queries.key, []).append(pending)
+
+            for group in groups.values():
+                try:
+                    # The processor resizes every image to the same square input,
+                    # so the batch stacks without extra padding
+                    pixel_values = torch.cat([pending.pixel_values for pending in group])
+                    outputs = object_detector.predict(pixel_values, group[0].queries)
+                except Exception as e:
+                    for pending in group:
+                        pending.future.set_exception(e)
+                    continue
+
+                for index, pending in enumerate(group):
+                    pending.future.set_result(OwlViTObjectDetectionOutput(
+                        logits=outputs.logits[index:index + 1],
+                        pred_boxes=outputs.pred_boxes[index:index + 1]
+                    ))
+
+    def _record(self, batch, started_at):
+        with self._metrics_lock:
+            self.batch_sizes[len(batch)] += 1
+            self.images += len(batch)
+            for pending in batch:
+                wait = started_at - pending.enqueued_at
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+    def stats(self) -> dict:
+        with self._metrics_lock:
+            batches = sum(self.batch_sizes.values())
+            return {
+                "window_ms": self.window * 1000,
+                "max_batch_size": self.max_batch_size,
+                "batches": batches,
+                "images": self.images,
+                "avg_batch_size": round(self.images / batches, 2) if batches else 0,
+                "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+                "avg_queue_wait_ms": round(self.total_wait / self.images * 1000, 2) if self.images else 0,
+                "max_queue_wait_ms": round(self.max_wait * 1000, 2),
+            }
+
+
+batcher = DetectionBatcher()
@@ -0,0 +1,122 @@
+import threading
+
+# Default product vocabulary used for OwlViT text queries
+DEFAULT_LABELS = [
+    # Giyim
+    "clothing",
+    "topwear",
+    "bottomwear",
+    "outerwear",
+    "apparel",
+    "sportswear",
+    "uniform",
+    "underwear",
+    "dress",
+    "outfit",
+
+    # Ayakkabı
+    "footwear",
+    "shoes",
+    "boots",
+    "sneakers",
+
+    # Aksesuarlar
+    "accessory",
+    "bag",
+    "backpack",
+    "handbag",
+    "wallet",
+    "belt",
+    "hat",
+    "cap",
+    "scarf",
+    "glasses",
+    "watch",
+    "jewelry",
+
+    # Elektronik
+    "electronics",
+    "device",
+    "gadget",
+    "smartphone",
+    "laptop",
+    "tablet",
+    "headphones",
+    "smartwatch",
+
+    # Kozmetik / Kişisel Bakım
+    "cosmetics",
+    "beauty product",
+    "skincare",
+    "makeup",
+    "perfume",
+    "hair product",
+
+    # Bebek ve çocuk
+    "baby product",
+    "baby clothes",
+    "toy",
+    "stroller",
+    "pacifier",
+
+    # Ev ve yaşam
+    "home item",
+    "furniture",
+    "appliance",
+    "decor",
+    "kitchenware",
+    "bedding",
+    "cleaning tool",
+
+    # Spor ve outdoor
+    "sports gear",
+    "fitness equipment",
+    "gym accessory",
+    "camping gear",
+    "bicycle equipment",
+]
+
+# Narrower vocabularies for tenants or catalogs that only sell one category.
+# Fewer queries means a smaller class head and fewer false positives.
+VOCABULARIES = {
+    "default": DEFAULT_LABELS,
+    "fashion": [
+        "clothing", "topwear", "bottomwear", "outerwear", "apparel", "sportswear",
+        "uniform", "underwear", "dress", "outfit", "footwear", "shoes", "boots",
+        "sneakers", "bag", "backpack", "handbag", "wallet", "belt", "hat", "cap",
+        "scarf", "glasses", "watch", "jewelry",
+    ],
+    "electronics": [
+        "electronics", "device", "gadget", "smartphone", "laptop", "tablet",
+        "headphones", "smartwatch", "appliance",
+    ],
+    "beauty": [
+        "cosmetics", "beauty product", "skincare", "makeup", "perfume", "hair product",
+    ],
+    "home": [
+        "home item", "furniture", "appliance", "decor", "kitchenware", "bedding",
+        "cleaning tool",
+    ],
+}
+
+_lock = threading.Lock()
+
+
+def register_vocabulary(name: str, labels: list):
+    """Registers (or replaces) a named label list, e.g. for a tenant."""
+    if not labels:
+        raise ValueError("A vocabulary needs at least one label.")
+    with _lock:
+        VOCABULARIES[name] = list(labels)
+
+
+def get_vocabulary(vocabulary="default") -> list:
+    """Resolves a vocabulary name or an explicit label list to a list of labels."""
+    if isinstance(vocabulary, (list, tuple)):
+        if not vocabulary:
+            raise ValueError("A vocabulary needs at least one label.")
+        return list(vocabulary)
+    with _lock:
+        if vocabulary not in VOCABULARIES:
+            raise ValueError(f"Unknown detection vocabulary: {vocabulary}")
+        return VOCABULARIES[vocabulary]
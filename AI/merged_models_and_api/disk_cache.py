@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from PIL import Image
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+STAGE_CACHE_DIR = os.getenv("STAGE_CACHE_DIR", os.path.join(script_dir, "cache", "stages"))
+# 0 disables the cache
+STAGE_CACHE_MAX_MB = float(os.getenv("STAGE_CACHE_MAX_MB", "512"))
+UPSCALE_CACHE_DIR = os.getenv("UPSCALE_CACHE_DIR", os.path.join(script_dir, "cache", "upscales"))
+UPSCALE_CACHE_MAX_MB = float(os.getenv("UPSCALE_CACHE_MAX_MB", "1024"))
+
+
+def image_digest(image) -> str:
+    """Content hash of a PIL image's pixels, mode and size."""
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def make_key(*parts) -> str:
+    """Cache key from JSON-serializable parts (content hashes, stage parameters)."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+class DiskLRUCache:
+    """
+    Size-capped key/value store on local disk with least-recently-used eviction.
+    Entries are plain files named by key; a hit refreshes the file's mtime so
+    recency survives worker restarts.
+    The cap covers the whole directory, whichever worker wrote the files: a worker
+    rescans the directory before evicting, and at the latest after writing a tenth
+    of the cap, so the total can only run over by what other workers wrote since.
+    File reads, writes and scans happen outside the lock; it only guards the index.
+    """
+
+    # Fraction of the cap a worker may write before it rescans the shared directory
+    RESCAN_FRACTION = 0.1
+
+    def __init__(self, directory, max_mb):
+        self.directory = directory
+        self.max_bytes = int(max_mb * 2**20)
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self._index = None  # key filename -> size, oldest first
+        self._total_bytes = 0
+        self._written_since_scan = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _scan(self):
+        """Index of every entry in the directory, oldest first, and their total size."""
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    # Evicted by another worker during the scan
+                    continue
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        index = OrderedDict((name, size) for _, name, size in sorted(entries))
+        return index, sum(index.values())
+
+    def _ensure_index(self):
+        if self._index is not None:
+            return
+        index, total = self._scan()
+        with self._lock:
+            if self._index is None:
+                self._index, self._total_bytes = index, total
+
+    def get_bytes(self, name):
+        if not self.enabled:
+            return None
+        self._ensure_index()
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            # Never written, or removed by another worker sharing the directory
+            with self._lock:
+                self._total_bytes -= self._index.pop(name, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            if name not in self._index:
+                # Written by another worker
+                self._index[name] = len(data)
+                self._total_bytes += len(data)
+            self._index.move_to_end(name)
+            self.hits += 1
+        return data
+
+    def put_bytes(self, name, data: bytes):
+        if not self.enabled or len(data) > self.max_bytes:
+            return
+        self._ensure_index()
+        path = os.path.join(self.directory, name)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self._total_bytes -= self._index.pop(name, 0)
+            self._index[name] = len(data)
+            self._total_bytes += len(data)
+            self._written_since_scan += len(data)
+            needs_scan = (self._total_bytes > self.max_bytes
+                          or self._written_since_scan > self.max_bytes * self.RESCAN_FRACTION)
+        if needs_scan:
+            self._evict()
+
+    def _evict(self):
+        """Rescans the shared directory and removes the oldest entries until it fits the cap."""
+        if not self._evict_lock.acquire(blocking=False):
+            # Another thread of this worker is already doing it
+            return
+        try:
+            index, total = self._scan()
+            evicted = 0
+            while total > self.max_bytes and index:
+                name, size = index.popitem(last=False)
+                total -= size
+                evicted += 1
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+            with self._lock:
+                self._index, self._total_bytes = index, total
+                self._written_since_scan = 0
+                self.evictions += evicted
+        finally:
+            self._evict_lock.release()
+
+    def get_json(self, key):
+        data = self.get_bytes(key + ".json")
+        return json.loads(data) if data is not None else None
+
+    def put_json(self, key, value):
+        self.put_bytes(key + ".json", json.dumps(value).encode())
+
+    def get_image(self, key):
+        data = self.get_bytes(key + ".png")
+        if data is None:
+            return None
+        image = Image.open(BytesIO(data))
+        image.load()
+        return image
+
+    def put_image(self, key, image):
+        buffer = BytesIO()
+        image.save(buffer, format="PNG", optimize=False, compress_level=6)
+        self.put_bytes(key + ".png", buffer.getvalue())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._index) if self._index is not None else None,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Detection boxes and alpha mattes, keyed by image content plus stage parameters
+stage_cache = DiskLRUCache(STAGE_CACHE_DIR, STAGE_CACHE_MAX_MB)
+# Remote Finegrain upscales, keyed by the uploaded PNG bytes plus every request parameter
+upscale_cache = DiskLRUCache(UPSCALE_CACHE_DIR, UPSCALE_CACHE_MAX_MB)
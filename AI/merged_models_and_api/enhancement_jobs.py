@@ -0,0 +1,180 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Pipelines (detect -> rembg -> options) running at the same time; more jobs wait in the queue
+ENHANCEMENT_JOB_WORKERS = int(os.getenv("ENHANCEMENT_JOB_WORKERS", "2"))
+# Jobs waiting or running before new submissions are refused
+ENHANCEMENT_JOB_MAX_PENDING = int(os.getenv("ENHANCEMENT_JOB_MAX_PENDING", "32"))
+# How long a finished job and its events stay available to late or reconnecting clients
+ENHANCEMENT_JOB_TTL_SECONDS = float(os.getenv("ENHANCEMENT_JOB_TTL_SECONDS", "600"))
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's pipeline when the client cancelled it."""
+
+
+class QueueFull(Exception):
+    """Raised by submit when ENHANCEMENT_JOB_MAX_PENDING jobs are already waiting or running."""
+
+
+class EnhancementJob:
+    """
+    One queued enhancement pipeline and the ordered events it has produced.
+    Events are kept for the job's lifetime so a client that connects late, or
+    reconnects with Last-Event-ID, still receives everything after that id.
+    """
+
+    def __init__(self):
+        self.id = str(uuid.uuid4())
+        self.processor_id = str(uuid.uuid4())
+        self.status = "queued"
+        self.stage = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self._events = []
+        self._condition = threading.Condition()
+        self._subscribers = []  # (event loop, asyncio.Event) of open event streams
+
+    def emit(self, event, data):
+        with self._condition:
+            self._events.append({"id": len(self._events) + 1, "event": event, "data": data})
+            self._condition.notify_all()
+            subscribers = list(self._subscribers)
+        for loop, wakeup in subscribers:
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                # The stream's event loop has closed
+                pass
+
+    def subscribe(self) -> asyncio.Event:
+        """An asyncio.Event on the running loop that emit sets; lets streams wait without a thread."""
+        wakeup = asyncio.Event()
+        with self._condition:
+            self._subscribers.append((asyncio.get_running_loop(), wakeup))
+        return wakeup
+
+    def unsubscribe(self, wakeup):
+        with self._condition:
+            self._subscribers = [entry for entry in self._subscribers if entry[1] is not wakeup]
+
+    def set_stage(self, stage):
+        """Records and announces a pipeline stage; also the point where cancellation takes effect."""
+        self.check_cancelled()
+        self.stage = stage
+        self.emit("stage", {"stage": stage})
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def finish(self, status, data=None, error=None):
+        self.status = status
+        self.error = error
+        self.finished = time.time()
+        self.emit(status, data if data is not None else {"error": error})
+
+    def events_after(self, last_id=0, timeout=15.0) -> list:
+        """Events with an id above last_id, waiting up to `timeout` seconds (if positive) for the first new one."""
+        with self._condition:
+            if timeout > 0 and len(self._events) <= last_id and self.status not in TERMINAL_STATUSES:
+                self._condition.wait(timeout)
+            return self._events[last_id:]
+
+    def snapshot(self) -> dict:
+        return {
+            "job_id": self.id,
+            "processor_id": self.processor_id,
+            "status": self.status,
+            "stage": self.stage,
+            "error": self.error,
+            "events": len(self._events),
+        }
+
+
+class JobManager:
+    """Runs enhancement jobs on a bounded worker pool and keeps them addressable by id."""
+
+    def __init__(self, workers=ENHANCEMENT_JOB_WORKERS, max_pending=ENHANCEMENT_JOB_MAX_PENDING,
+                 ttl_seconds=ENHANCEMENT_JOB_TTL_SECONDS):
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="enhance-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self.workers = workers
+        self.submitted = 0
+        self.rejected = 0
+        self.cancelled = 0
+
+    def _prune(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished is not None and now - job.finished > self.ttl_seconds:
+                del self._jobs[job_id]
+
+    def submit(self, pipeline, *args) -> EnhancementJob:
+        """Queues pipeline(job, *args); its return value becomes the data of the final completed event."""
+        with self._lock:
+            self._prune()
+            pending = sum(job.status not in TERMINAL_STATUSES for job in self._jobs.values())
+            if pending >= self.max_pending:
+                self.rejected += 1
+                raise QueueFull(f"{pending} enhancement jobs are already pending")
+            job = EnhancementJob()
+            self._jobs[job.id] = job
+            self.submitted += 1
+        job.emit("queued", job.snapshot())
+        self._executor.submit(self._run, job, pipeline, args)
+        return job
+
+    def _run(self, job, pipeline, args):
+        try:
+            job.check_cancelled()
+            job.status = "running"
+            result = pipeline(job, *args)
+            job.finish("completed", result)
+        except JobCancelled:
+            print(f"Enhancement job {job.id} cancelled")
+            job.finish("cancelled", {"job_id": job.id})
+        except Exception as e:
+            print(f"Enhancement job {job.id} failed: {str(e)}")
+            job.finish("failed", error=str(e))
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id) -> bool:
+        """Asks a job to stop; a queued job never starts, a running one stops at its next stage."""
+        job = self.get(job_id)
+        if job is None or job.status in TERMINAL_STATUSES:
+            return False
+        job.cancel_event.set()
+        with self._lock:
+            self.cancelled += 1
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+            return {
+                "workers": self.workers,
+                "queued": statuses.count("queued"),
+                "running": statuses.count("running"),
+                "retained": len(statuses),
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "cancelled": self.cancelled,
+            }
+
+
+jobs = JobManager()
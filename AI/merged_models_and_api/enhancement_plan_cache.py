@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one worker are serialized
+    fcntl = None
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+PLAN_CACHE_PATH = os.getenv("PLAN_CACHE_PATH", os.path.join(script_dir, "cache", "enhancement_plans.json"))
+# Plans older than this are asked for again (default one week, 0 disables the cache)
+PLAN_CACHE_TTL_SECONDS = float(os.getenv("PLAN_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+BRIGHTNESS_BUCKET = 16
+
+
+def feature_key(analysis: dict) -> str:
+    """
+    Quantizes the analysis numbers the option 3 prompt depends on into a bucket key.
+    Images in the same bucket would get practically the same plan from the LLM.
+    """
+    shorter_side = min(analysis['width'], analysis['height'])
+    if shorter_side < 500:
+        size_class = "small"
+    elif shorter_side < 1500:
+        size_class = "medium"
+    else:
+        size_class = "large"
+    aspect_bucket = min(max(round(analysis['aspect_ratio'] * 4) / 4, 0.25), 4.0)
+    brightness_bucket = int(analysis['avg_brightness'] // BRIGHTNESS_BUCKET)
+
+    parts = [
+        f"b{brightness_bucket}",
+        size_class,
+        f"a{aspect_bucket:.2f}",
+        f"dark{int(analysis['is_dark'])}",
+        f"small{int(analysis['is_small'])}",
+        # These two decide the extra recommendations that go into the prompt
+        f"soft{int(analysis.get('blur_score', 1e9) < 100)}",
+        f"noisy{int(analysis.get('noise_sigma', 0) > 5)}",
+    ]
+    return "|".join(parts)
+
+
+class EnhancementPlanCache:
+    """
+    Parsed enhancement plans keyed by feature bucket, with TTL, persisted as one JSON file.
+    The file is shared by all workers: it is re-read when another worker changed it, and
+    every write merges with its current contents under an exclusive file lock.
+    """
+
+    def __init__(self, path=PLAN_CACHE_PATH, ttl_seconds=PLAN_CACHE_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = None
+        self._mtime = None
+        self.hits = 0
+        self.misses = 0
+
+    def _read_file(self) -> dict:
+        try:
+            self._mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _load(self):
+        """Loads the file on first use and again whenever another worker has rewritten it."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if self._entries is None or mtime != self._mtime:
+            self._entries = self._read_file()
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save(self):
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self._entries, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def get(self, key):
+        if self.ttl_seconds <= 0:
+            return None
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry["created"] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(entry["plan"])
+
+    def put(self, key, plan: dict):
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock, self._file_lock():
+            # Start from what is on disk now, so entries other workers added are kept
+            entries = self._read_file()
+            now = time.time()
+            # Drop expired entries whenever the file is rewritten
+            self._entries = {
+                k: v for k, v in entries.items() if now - v["created"] <= self.ttl_seconds
+            }
+            self._entries[key] = {"plan": plan, "created": now}
+            self._save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries) if self._entries is not None else None,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+plan_cache = EnhancementPlanCache()
@@ -0,0 +1,152 @@
+import json
+import math
+import os
+import threading
+import numpy as np
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+# llm: always ask Gemini, local: never ask, auto: ask only when an API key is configured
+OPTION3_PLANNER = os.getenv("OPTION3_PLANNER", "auto")
+PLANNER_MODEL_PATH = os.getenv("PLANNER_MODEL_PATH", os.path.join(script_dir, "planner_model.json"))
+PLAN_LOG_PATH = os.getenv("PLAN_LOG_PATH", os.path.join(script_dir, "cache", "llm_plans.jsonl"))
+
+PLANNERS = ("llm", "local", "auto")
+PLAN_PARAMETERS = ("brightness", "contrast", "sharpness", "noise_reduction")
+# Same ranges the LLM prompt asks for
+PARAMETER_RANGES = {
+    "brightness": (0.8, 1.5),
+    "contrast": (0.8, 1.5),
+    "sharpness": (0.8, 2.0),
+    "noise_reduction": (0.3, 2.0),
+}
+# Factors this close to 1.0 do nothing visible, so they are reported as SKIP like the LLM does
+SKIP_TOLERANCE = 0.02
+
+
+def resolve_planner(planner=None) -> str:
+    planner = planner or OPTION3_PLANNER
+    if planner not in PLANNERS:
+        raise ValueError(f"Unknown option 3 planner: {planner}")
+    if planner == "auto":
+        return "llm" if os.getenv("SECRET_API_KEY") else "local"
+    return planner
+
+
+def feature_vector(analysis: dict) -> np.ndarray:
+    """Scaled analysis features used by the fitted planner, with a leading bias term."""
+    return np.array([
+        1.0,
+        analysis['avg_brightness'] / 255,
+        float(analysis['is_dark']),
+        float(analysis['is_small']),
+        analysis.get('contrast_std', 64.0) / 128,
+        math.log1p(analysis.get('blur_score', 1000.0)) / 10,
+        analysis.get('noise_sigma', 2.0) / 10,
+    ])
+
+
+def table_plan(analysis: dict) -> dict:
+    """Decision table that encodes the rules given to the LLM in its prompt."""
+    brightness = analysis['avg_brightness']
+    if brightness < 90:
+        # 1.4 for very dark images, easing to 1.2 at the threshold
+        brightness_factor = round(1.4 - 0.2 * min(max((brightness - 40) / 50, 0.0), 1.0), 2)
+    elif brightness < 130:
+        brightness_factor = 1.1
+    else:
+        brightness_factor = 'SKIP'
+
+    contrast_std = analysis.get('contrast_std', 64.0)
+    if contrast_std < 40:
+        contrast_factor = 1.3
+    elif contrast_std < 60:
+        contrast_factor = 1.2
+    else:
+        contrast_factor = 1.1
+
+    if analysis['is_small']:
+        sharpness_factor = 1.5
+    elif analysis.get('blur_score', 1000.0) < 100:
+        sharpness_factor = 1.4
+    else:
+        sharpness_factor = 1.2
+
+    noise_radius = 0.8 if analysis.get('noise_sigma', 0.0) > 5 else 0.5
+
+    return {
+        'brightness': brightness_factor,
+        'contrast': contrast_factor,
+        'sharpness': sharpness_factor,
+        'noise_reduction': noise_radius,
+    }
+
+
+def plan_to_targets(plan: dict) -> list:
+    """Numeric regression targets for a plan; SKIP means a neutral value."""
+    neutral = {"brightness": 1.0, "contrast": 1.0, "sharpness": 1.0, "noise_reduction": 0.0}
+    return [neutral[name] if plan.get(name) == 'SKIP' else float(plan[name]) for name in PLAN_PARAMETERS]
+
+
+class LocalPlanner:
+    """
+    Predicts the option 3 plan from the image analysis without any network call.
+    Uses least-squares coefficients fitted on logged LLM plans when PLANNER_MODEL_PATH
+    exists (see fit_enhancement_planner.py), otherwise the prompt's decision table.
+    """
+
+    def __init__(self, model_path=PLANNER_MODEL_PATH):
+        self.model_path = model_path
+        self._coefficients = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                with open(self.model_path) as f:
+                    model = json.load(f)
+                self._coefficients = np.array([model["coefficients"][name] for name in PLAN_PARAMETERS])
+                print(f"Loaded fitted enhancement planner from {self.model_path} ({model.get('samples')} samples)")
+            except FileNotFoundError:
+                self._coefficients = None
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Ignoring unusable planner model {self.model_path}: {e}")
+                self._coefficients = None
+            self._loaded = True
+
+    def is_fitted(self) -> bool:
+        self._load()
+        return self._coefficients is not None
+
+    def plan(self, analysis: dict) -> dict:
+        self._load()
+        if self._coefficients is None:
+            return table_plan(analysis)
+
+        predictions = self._coefficients @ feature_vector(analysis)
+        plan = {}
+        for name, value in zip(PLAN_PARAMETERS, predictions):
+            low, high = PARAMETER_RANGES[name]
+            if name == "noise_reduction":
+                plan[name] = round(float(np.clip(value, low, high)), 2) if value >= low / 2 else 'SKIP'
+            elif abs(value - 1.0) < SKIP_TOLERANCE:
+                plan[name] = 'SKIP'
+            else:
+                plan[name] = round(float(np.clip(value, low, high)), 2)
+        return plan
+
+
+def log_llm_plan(analysis: dict, plan: dict):
+    """Appends an LLM plan with its features to PLAN_LOG_PATH, the training data for the local planner."""
+    try:
+        os.makedirs(os.path.dirname(PLAN_LOG_PATH), exist_ok=True)
+        record = {"features": feature_vector(analysis).tolist(), "plan": plan}
+        with open(PLAN_LOG_PATH, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"Could not log enhancement plan: {e}")
+
+
+local_planner = LocalPlanner()
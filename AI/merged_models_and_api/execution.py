@@ -0,0 +1,138 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+import numpy as np
+from PIL import Image
+
+# Worker processes for pure CPU image work (NumPy/OpenCV/PIL); 0 runs those ops in the calling thread
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Threads for blocking calls made from request handlers: model inference, network, file I/O
+BLOCKING_IO_WORKERS = int(os.getenv("BLOCKING_IO_WORKERS", "32"))
+
+io_executor = ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="blocking-io")
+
+_cpu_pool = None
+_cpu_pool_lock = threading.Lock()
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Awaits a blocking call on the I/O thread pool so the event loop keeps serving other requests."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor, functools.partial(fn, *args, **kwargs))
+
+
+# CPU ops that can run in a worker process: uint8 array in, uint8 array out.
+# Their modules are imported inside the op so worker processes only load what they use.
+def _option1_op(pixels, **params):
+    import fused_enhancement
+    return np.asarray(fused_enhancement.enhance_option1(Image.fromarray(pixels), **params))
+
+
+def _local_upscale_op(pixels, **params):
+    import local_upscaler
+    return np.asarray(local_upscaler.upscaler.upscale(Image.fromarray(pixels), **params))
+
+
+CPU_OPS = {
+    "option1": _option1_op,
+    "local_upscale": _local_upscale_op,
+}
+
+
+def _run_in_worker(op_name, input_name, shape, params):
+    """
+    Worker side: reads the input from shared memory and writes the result into a new block.
+    Workers share the parent's resource tracker, so blocks are registered once and the
+    parent's unlink() is the only cleanup needed.
+    """
+    input_block = shared_memory.SharedMemory(name=input_name)
+    try:
+        pixels = np.ndarray(shape, dtype=np.uint8, buffer=input_block.buf)
+        result = CPU_OPS[op_name](pixels, **params)
+        del pixels
+    finally:
+        input_block.close()
+
+    # The parent unlinks the output once it has copied it out
+    output_block = shared_memory.SharedMemory(create=True, size=max(result.nbytes, 1))
+    np.ndarray(result.shape, dtype=np.uint8, buffer=output_block.buf)[...] = result
+    output_name = output_block.name
+    output_block.close()
+    return output_name, result.shape
+
+
+def get_cpu_pool():
+    """The shared process pool, started on first use; None when CPU_WORKERS is 0."""
+    global _cpu_pool
+    if CPU_WORKERS <= 0:
+        return None
+    with _cpu_pool_lock:
+        if _cpu_pool is None:
+            # spawn: forking a process that holds torch/ONNX thread pools is not safe.
+            # Spawned workers re-import the __main__ script, so the app must be started as
+            # `uvicorn rf_ai_api:app`; with `python rf_ai_api.py` every worker would load all models.
+            _cpu_pool = ProcessPoolExecutor(max_workers=CPU_WORKERS, mp_context=get_context("spawn"))
+        return _cpu_pool
+
+
+def _reset_cpu_pool(broken_pool):
+    global _cpu_pool
+    with _cpu_pool_lock:
+        if _cpu_pool is broken_pool:
+            _cpu_pool = None
+
+
+def run_image_op(op_name, image, **params):
+    """
+    Runs a CPU_OPS entry on a PIL image in a worker process and returns a PIL image.
+    Pixels travel through shared memory in both directions instead of being pickled;
+    without a process pool (or after it broke) the op runs in the calling thread.
+    """
+    if image.mode not in ("L", "RGB", "RGBA"):
+        image = image.convert("RGB")
+    pixels = np.asarray(image)
+    pool = get_cpu_pool()
+    if pool is None:
+        return Image.fromarray(CPU_OPS[op_name](pixels, **params))
+
+    input_block = shared_memory.SharedMemory(create=True, size=max(pixels.nbytes, 1))
+    try:
+        np.ndarray(pixels.shape, dtype=np.uint8, buffer=input_block.buf)[...] = pixels
+        output_name, shape = pool.submit(_run_in_worker, op_name, input_block.name, pixels.shape, params).result()
+    except BrokenProcessPool:
+        print(f"CPU worker pool broke while running {op_name}; running it in-process")
+        _reset_cpu_pool(pool)
+        return Image.fromarray(CPU_OPS[op_name](pixels, **params))
+    finally:
+        input_block.close()
+        input_block.unlink()
+
+    output_block = shared_memory.SharedMemory(name=output_name)
+    try:
+        result = np.ndarray(shape, dtype=np.uint8, buffer=output_block.buf).copy()
+    finally:
+        output_block.close()
+        output_block.unlink()
+    return Image.fromarray(result)
+
+
+def shutdown():
+    global _cpu_pool
+    with _cpu_pool_lock:
+        if _cpu_pool is not None:
+            _cpu_pool.shutdown(wait=False, cancel_futures=True)
+            _cpu_pool = None
+    io_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def stats() -> dict:
+    return {
+        "cpu_workers": CPU_WORKERS,
+        "cpu_pool_started": _cpu_pool is not None,
+        "blocking_io_workers": BLOCKING_IO_WORKERS,
+        "blocking_io_queued": io_executor._work_queue.qsize(),
+    }
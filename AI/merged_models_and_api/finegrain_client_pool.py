@@ -0,0 +1,160 @@
+import io
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from PIL import Image
+
+FINEGRAIN_SPACE = os.getenv("FINEGRAIN_SPACE", "finegrain/finegrain-image-enhancer")
+# Each gradio Client already multiplexes jobs over its own worker threads; a couple of
+# clients spread the load over separate connections to the Space
+FINEGRAIN_CLIENTS = int(os.getenv("FINEGRAIN_CLIENTS", "2"))
+FINEGRAIN_TIMEOUT_SECONDS = float(os.getenv("FINEGRAIN_TIMEOUT_SECONDS", "85"))
+
+# Parameters sent with every upscale; fixed seed, steps and solver make the result deterministic
+FINEGRAIN_PARAMS = {
+    "prompt": "",
+    "negative_prompt": "",
+    "seed": 0,
+    "upscale_factor": 2.6,
+    "controlnet_scale": 0.5,
+    "controlnet_decay": 0.6,
+    "condition_scale": 5,
+    "tile_width": 200,
+    "tile_height": 200,
+    "denoise_strength": 0,
+    "num_inference_steps": 23,
+    "solver": "DPMSolver",
+}
+
+
+def encode_png(image) -> bytes:
+    """PNG bytes of an image, encoded in memory; low compression since it is only uploaded once."""
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+class FinegrainClientPool:
+    """
+    Shared gradio Clients for the Finegrain upscaler Space.
+    Clients are created once (the Space config is fetched on construction) and jobs
+    are handed out round-robin with client.submit, so concurrent requests overlap
+    their remote waits instead of each opening new connections.
+    """
+
+    def __init__(self, space=FINEGRAIN_SPACE, size=FINEGRAIN_CLIENTS):
+        self.space = space
+        self.size = size
+        self._clients = [None] * size
+        self._client_locks = [threading.Lock() for _ in range(size)]
+        self._next_slot = itertools.count()
+        self._metrics_lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.total_seconds = 0.0
+
+    def _client(self, slot):
+        """The client in one slot, connecting on first use or after it was dropped."""
+        client = self._clients[slot]
+        if client is not None:
+            return client
+        with self._client_locks[slot]:
+            if self._clients[slot] is None:
+                from gradio_client import Client
+                print(f"Connecting Finegrain client {slot} to {self.space}...")
+                self._clients[slot] = Client(self.space, hf_token=os.getenv("HF_TOKEN"), verbose=False)
+            return self._clients[slot]
+
+    def _drop_client(self, slot):
+        """Forgets a client whose connection failed so the next job reconnects."""
+        with self._client_locks[slot]:
+            self._clients[slot] = None
+
+    def start(self):
+        """Connects every client up front; connection errors are left for the first job to retry."""
+        for slot in range(self.size):
+            try:
+                self._client(slot)
+            except Exception as e:
+                print(f"Could not connect Finegrain client {slot}: {e}")
+
+    def submit(self, image_path, **params):
+        """Submits one upscale job and returns (slot, gradio Job) without waiting for it."""
+        from gradio_client import handle_file
+        slot = next(self._next_slot) % self.size
+        job = self._client(slot).submit(
+            input_image=handle_file(image_path),
+            api_name="/process",
+            **{**FINEGRAIN_PARAMS, **params}
+        )
+        with self._metrics_lock:
+            self.submitted += 1
+            self.in_flight += 1
+        return slot, job
+
+    def upscale(self, image_path, timeout=FINEGRAIN_TIMEOUT_SECONDS, cancel_event=None, **params):
+        """
+        Runs one upscale job and returns the result as an in-memory PIL image.
+        Raises TimeoutError (after cancelling the remote job) when it takes longer than
+        `timeout` seconds or when `cancel_event` is set while waiting.
+        """
+        start = time.perf_counter()
+        slot, job = self.submit(image_path, **params)
+        try:
+            while True:
+                remaining = timeout - (time.perf_counter() - start)
+                if remaining <= 0 or (cancel_event is not None and cancel_event.is_set()):
+                    job.cancel()
+                    with self._metrics_lock:
+                        self.timeouts += 1
+                    raise TimeoutError(f"Finegrain upscale cancelled after {time.perf_counter() - start:.1f}s")
+                try:
+                    result = job.result(timeout=min(remaining, 0.5))
+                    break
+                except FutureTimeoutError:
+                    continue
+        except TimeoutError:
+            raise
+        except Exception:
+            with self._metrics_lock:
+                self.failures += 1
+            self._drop_client(slot)
+            raise
+        finally:
+            with self._metrics_lock:
+                self.in_flight -= 1
+
+        # result[1] is the upscaled image downloaded to a local file by the client
+        output_path = result[1]
+        image = Image.open(output_path)
+        image.load()
+        try:
+            os.remove(output_path)
+        except OSError:
+            pass
+        with self._metrics_lock:
+            self.completed += 1
+            self.total_seconds += time.perf_counter() - start
+        return image
+
+    def stats(self) -> dict:
+        with self._metrics_lock:
+            return {
+                "space": self.space,
+                "clients": self.size,
+                "connected": sum(client is not None for client in self._clients),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "in_flight": self.in_flight,
+                "timeouts": self.timeouts,
+                "failures": self.failures,
+                "avg_latency_ms": round(self.total_seconds / self.completed * 1000, 1) if self.completed else 0,
+            }
+
+
+client_pool = FinegrainClientPool()
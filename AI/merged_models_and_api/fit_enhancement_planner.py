@@ -0,0 +1,58 @@
+"""
+Fit the local option 3 planner on logged LLM plans.
+
+Every Gemini plan is appended to PLAN_LOG_PATH together with the image features.
+This fits one least-squares model per plan parameter and writes the coefficients
+to PLANNER_MODEL_PATH, where enhancement_planner.LocalPlanner picks them up.
+
+    python fit_enhancement_planner.py [--log llm_plans.jsonl] [--output planner_model.json]
+"""
+import argparse
+import json
+import numpy as np
+import enhancement_planner
+
+MIN_SAMPLES = 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default=enhancement_planner.PLAN_LOG_PATH)
+    parser.add_argument("--output", default=enhancement_planner.PLANNER_MODEL_PATH)
+    parser.add_argument("--ridge", type=float, default=1e-3, help="L2 regularization strength")
+    args = parser.parse_args()
+
+    features, targets = [], []
+    with open(args.log) as f:
+        for line in f:
+            record = json.loads(line)
+            features.append(record["features"])
+            targets.append(enhancement_planner.plan_to_targets(record["plan"]))
+
+    if len(features) < MIN_SAMPLES:
+        raise SystemExit(f"Only {len(features)} logged plans, need at least {MIN_SAMPLES} to fit.")
+
+    X = np.array(features)
+    Y = np.array(targets)
+    # Ridge regression via the normal equations; the bias column is not regularized
+    penalty = args.ridge * np.eye(X.shape[1])
+    penalty[0, 0] = 0
+    coefficients = np.linalg.solve(X.T @ X + penalty, X.T @ Y).T
+
+    residuals = X @ coefficients.T - Y
+    for name, error in zip(enhancement_planner.PLAN_PARAMETERS, np.abs(residuals).mean(axis=0)):
+        print(f"{name:<16} mean absolute error {error:.3f}")
+
+    model = {
+        "samples": len(features),
+        "coefficients": {
+            name: row.tolist() for name, row in zip(enhancement_planner.PLAN_PARAMETERS, coefficients)
+        },
+    }
+    with open(args.output, "w") as f:
+        json.dump(model, f, indent=2)
+    print(f"Wrote planner model for {len(features)} samples to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
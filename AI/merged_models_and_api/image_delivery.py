@@ -0,0 +1,103 @@
+import hashlib
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from io import BytesIO
+
+# JPEG quality of images served by GET /processor/{id}/image/{kind}
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "95"))
+# Seconds browsers may reuse a served image without revalidating it
+IMAGE_MAX_AGE_SECONDS = int(os.getenv("IMAGE_MAX_AGE_SECONDS", "3600"))
+# Encoded bytes kept so repeated and conditional requests skip the JPEG encode
+ENCODED_IMAGE_CACHE_MB = float(os.getenv("ENCODED_IMAGE_CACHE_MB", "128"))
+
+# URL kind -> process_image attribute
+IMAGE_KINDS = {
+    "original": "raw_image",
+    "no_background": "no_background_image",
+    "option_1": "enhanced_image_1",
+    "option_2": "enhanced_image_2",
+    "option_3": "enhanced_image_3",
+}
+
+
+def image_url(processor_id, kind):
+    """Path of one processor image, relative to the API base URL."""
+    return f"/processor/{processor_id}/image/{kind}"
+
+
+def option_url(processor_id, number, option_status):
+    """URL of an option's image, or None if it failed or did not finish before its deadline."""
+    if option_status.get(number) in ("timeout", "cancelled", "failed"):
+        return None
+    return image_url(processor_id, f"option_{number}")
+
+
+def encode_jpeg(pil_image) -> bytes:
+    if pil_image.mode != "RGB":
+        pil_image = pil_image.convert("RGB")
+    buffer = BytesIO()
+    pil_image.save(buffer, format="JPEG", quality=IMAGE_JPEG_QUALITY)
+    return buffer.getvalue()
+
+
+class EncodedImageCache:
+    """
+    JPEG bytes and ETag per (processor id, kind), least recently used first.
+    An entry is only reused while it belongs to the very image object it was
+    encoded from, so a recomputed or rehydrated image is encoded again. The ETag
+    is a hash of the bytes, so it stays the same when the pixels do.
+    """
+
+    def __init__(self, max_mb=ENCODED_IMAGE_CACHE_MB):
+        self.max_bytes = int(max_mb * 2**20)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (processor id, kind) -> (weakref to image, bytes, etag)
+        self.bytes_held = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, processor_id, kind, image):
+        """(bytes, etag) for an image, encoding it on a miss."""
+        key = (processor_id, kind)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0]() is image:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], entry[2]
+            self.misses += 1
+
+        data = encode_jpeg(image)
+        etag = f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes_held -= len(old[1])
+            if len(data) <= self.max_bytes:
+                self._entries[key] = (weakref.ref(image), data, etag)
+                self.bytes_held += len(data)
+            while self.bytes_held > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self.bytes_held -= len(evicted)
+        return data, etag
+
+    def discard(self, processor_id):
+        """Forgets every image of a processor, e.g. on cleanup."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == processor_id]:
+                self.bytes_held -= len(self._entries.pop(key)[1])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes_held": self.bytes_held,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+encoded_images = EncodedImageCache()
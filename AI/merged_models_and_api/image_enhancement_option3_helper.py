@@ -3,63 +3,91 @@ import uuid
 from PIL import Image, ImageEnhance, ImageFilter
 from langchain_google_genai import ChatGoogleGenerativeAI
 from dotenv import load_dotenv
+import point_ops
+import image_analysis
+import enhancement_plan_cache
+import enhancement_planner
 
 load_dotenv()
 
 class image_enhancement_option3_helper:
-    def __init__(self, model):
+    def __init__(self, model, planner=None):
         self.model = model
+        self.planner = planner
+        # Which planner produced the last plan: llm, cache, local or rule_based
+        self.plan_source = None
+        # Plan fields the last LLM reply did not contain, filled in with defaults
+        self.defaulted_fields = []
     
-    def analyze_image(self, img) -> dict:
-        """Analyzes an image and returns its properties."""
+    def analyze_image(self, img, alpha=None) -> dict:
+        """Analyzes an image and returns its properties; `alpha` limits the statistics to the product."""
         try:
-            width, height = img.size
-            mode = img.mode
-            
-            # Simple brightness analysis
-            grayscale = img.convert('L')
-            pixels = list(grayscale.getdata())
-            avg_brightness = sum(pixels) / len(pixels)
-            
-            analysis = {
-                'width': width,
-                'height': height,
-                'mode': mode,
-                'avg_brightness': avg_brightness,
-                'is_dark': avg_brightness < 100,
-                'is_small': width < 500 or height < 500,
-                'aspect_ratio': width / height,
-                'recommendations': []
-            }
-            
-            # Generate recommendations
-            if analysis['is_dark']:
-                analysis['recommendations'].append(f"Increase brightness (current: {avg_brightness:.1f})")
-            
-            analysis['recommendations'].append("Enhance contrast for better dynamic range")
-            
-            if analysis['is_small']:
-                analysis['recommendations'].append("Apply sharpening (small image)")
-            
-            analysis['recommendations'].append("Light noise reduction for smoothing")
-            return analysis
-                
+            return image_analysis.analyze_image(img, alpha)
         except Exception as e:
             print(f"Error analyzing image: {e}")
             return {}
 
-    def ai_enhanced_image_processing(self, image: Image) -> str:
+    def ai_enhanced_image_processing(self, image: Image, alpha: Image = None) -> str:
         """
         Uses AI to analyze the image and decide on enhancements, then applies them.
         This is a hybrid approach that uses AI for decision making but direct Python for processing.
+        `alpha` is the product matte when the image has already been placed on a background.
         """
         # Step 1: Analyze the image
-        analysis = self.analyze_image(image)
+        analysis = self.analyze_image(image, alpha)
         if not analysis:
             return None
         
         
-        # Step 2: Using Google Generative AI to decide on enhancements
+        # Step 2: Decide on enhancements, locally or through the LLM (reusing the plan of a similar image when cached)
+        try:
+            if enhancement_planner.resolve_planner(self.planner) == "local":
+                enhancement_plan = enhancement_planner.local_planner.plan(analysis)
+                self.plan_source = "local"
+                print(f"Local enhancement plan: {enhancement_plan}")
+            else:
+                cache_key = enhancement_plan_cache.feature_key(analysis)
+                enhancement_plan = enhancement_plan_cache.plan_cache.get(cache_key)
+                if enhancement_plan is None:
+                    enhancement_plan = self.request_ai_plan(analysis)
+                    if self.defaulted_fields:
+                        # Not the LLM's plan: neither reuse it for the bucket nor train on it
+                        print(f"LLM plan incomplete, defaults used for {', '.join(self.defaulted_fields)}; not caching it")
+                    else:
+                        enhancement_plan_cache.plan_cache.put(cache_key, enhancement_plan)
+                        enhancement_planner.log_llm_plan(analysis, enhancement_plan)
+                    self.plan_source = "llm"
+                else:
+                    print(f"Using cached enhancement plan for {cache_key}: {enhancement_plan}")
+                    self.plan_source = "cache"
+
+            # Brightness and contrast are folded into a single lookup table pass
+            point_chain = point_ops.PointOpChain()
+            if enhancement_plan.get('brightness') != 'SKIP':
+                print(f"Applying brightness enhancement (factor: {enhancement_plan['brightness']})")
+                point_chain.brightness(enhancement_plan['brightness'])
+
+            if enhancement_plan.get('contrast') != 'SKIP':
+                print(f"Applying contrast enhancement (factor: {enhancement_plan['contrast']})")
+                point_chain.contrast(enhancement_plan['contrast'])
+            current_image = point_chain.apply(image)
+
+            if enhancement_plan.get('sharpness') != 'SKIP':
+                print(f"Applying sharpness enhancement (factor: {enhancement_plan['sharpness']})")
+                current_image = self.increase_sharpness(current_image, enhancement_plan['sharpness'])
+
+            if enhancement_plan.get('noise_reduction') != 'SKIP':
+                print(f"Applying noise reduction (radius: {enhancement_plan['noise_reduction']})")
+                current_image = self.noise_reduction(current_image, enhancement_plan['noise_reduction'])
+            return current_image 
+            
+        except Exception as e:
+            print(f"Enhancement planning failed, using rules: {e}")
+            self.plan_source = "rule_based"
+            return self.rule_based_enhancement(image, analysis)
+
+    def request_ai_plan(self, analysis: dict) -> dict:
+        """Uses Google Generative AI to decide on enhancements for the analyzed image."""
         llm = ChatGoogleGenerativeAI(
             model="gemini-2.5-flash",
             google_api_key=os.getenv("SECRET_API_KEY"),
@@ -93,32 +121,10 @@ class image_enhancement_option3_helper:
         - For small images, use higher sharpness (1.3-1.8)
         - Use light noise reduction (0.5-0.8) for final smoothing
         """
-        
-        try:
-            ai_response = llm.invoke(ai_prompt)
-            print(f"AI Enhancement Plan:\n{ai_response.content}")
-            
-            enhancement_plan = self.parse_ai_response(ai_response.content)
-                    
-            if enhancement_plan.get('brightness') != 'SKIP':
-                print(f"Applying brightness enhancement (factor: {enhancement_plan['brightness']})")
-                current_image = self.increase_brightness(image, enhancement_plan['brightness'])
-
-            if enhancement_plan.get('contrast') != 'SKIP':
-                print(f"Applying contrast enhancement (factor: {enhancement_plan['contrast']})")
-                current_image = self.increase_contrast(current_image, enhancement_plan['contrast'])
 
-            if enhancement_plan.get('sharpness') != 'SKIP':
-                print(f"Applying sharpness enhancement (factor: {enhancement_plan['sharpness']})")
-                current_image = self.increase_sharpness(current_image, enhancement_plan['sharpness'])
-
-            if enhancement_plan.get('noise_reduction') != 'SKIP':
-                print(f"Applying noise reduction (radius: {enhancement_plan['noise_reduction']})")
-                current_image = self.noise_reduction(current_image, enhancement_plan['noise_reduction'])
-            return current_image 
-            
-        except Exception as e:
-            return self.rule_based_enhancement(image, analysis)
+        ai_response = llm.invoke(ai_prompt)
+        print(f"AI Enhancement Plan:\n{ai_response.content}")
+        return self.parse_ai_response(ai_response.content)
 
     def parse_ai_response(self,response: str) -> dict:
         """Parse the AI response to extract enhancement parameters."""
@@ -140,6 +146,9 @@ class image_enhancement_option3_helper:
                 plan['noise_reduction'] = float(value) if value != 'SKIP' else 'SKIP'
         
         # Set defaults if not provided
+        self.defaulted_fields = [
+            field for field in ('brightness', 'contrast', 'sharpness', 'noise_reduction') if field not in plan
+        ]
         plan.setdefault('brightness', 1.1)
         plan.setdefault('contrast', 1.2)
         plan.setdefault('sharpness', 1.3)
@@ -151,12 +160,13 @@ class image_enhancement_option3_helper:
         """Fallback rule-based enhancement if AI fails."""
         print("🔧 Applying rule-based enhancement...")
 
-        current_image = image
+        point_chain = point_ops.PointOpChain()
 
         if analysis['is_dark']:
-            current_image = self.increase_brightness(current_image, 1.3)
+            point_chain.brightness(1.3)
 
-        current_image = self.increase_contrast(current_image, 1.2)
+        point_chain.contrast(1.2)
+        current_image = point_chain.apply(image)
 
         if analysis['is_small']:
             current_image = self.increase_sharpness(current_image, 1.4)
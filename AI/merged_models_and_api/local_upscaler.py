@@ -0,0 +1,133 @@
+import os
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import cv2
+import numpy as np
+from PIL import Image
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+# Optional OpenCV super-resolution model, e.g. ESPCN_x4.pb or FSRCNN_x3.pb from the opencv_contrib model zoo;
+# needs opencv-contrib-python. Without it the Lanczos-plus-detail pipeline is used.
+LOCAL_SR_MODEL_PATH = os.getenv("LOCAL_SR_MODEL_PATH", os.path.join(script_dir, "sr_models", "ESPCN_x4.pb"))
+# Seconds to wait for the remote upscaler before starting the local one; negative disables the hedge
+OPTION2_HEDGE_SECONDS = float(os.getenv("OPTION2_HEDGE_SECONDS", "20"))
+
+# Rows sharpened per strip after the resize; bounds float temporaries on large outputs
+_STRIP_ROWS = 256
+_MODEL_NAME_PATTERN = re.compile(r"(espcn|fsrcnn|fsrcnn-small|lapsrn|edsr)_x(\d)", re.IGNORECASE)
+
+_hedge_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("OPTION2_HEDGE_WORKERS", "8")), thread_name_prefix="option2-hedge"
+)
+
+
+class LocalUpscaler:
+    """
+    CPU super-resolution for option 2 when the Finegrain Space is slow or unavailable.
+    Uses cv2.dnn_superres with the model at LOCAL_SR_MODEL_PATH when OpenCV was built
+    with it, otherwise Lanczos resampling followed by a strip-wise detail boost.
+    """
+
+    def __init__(self, model_path=LOCAL_SR_MODEL_PATH):
+        self.model_path = model_path
+        self._thread_models = threading.local()
+        match = _MODEL_NAME_PATTERN.search(os.path.basename(model_path))
+        self.dnn_available = bool(match) and hasattr(cv2, "dnn_superres") and os.path.exists(model_path)
+        self.algorithm = match.group(1).lower() if match else None
+        self.model_scale = int(match.group(2)) if match else None
+
+    @property
+    def engine(self) -> str:
+        return f"dnn_superres:{self.algorithm}_x{self.model_scale}" if self.dnn_available else "lanczos_detail"
+
+    def _dnn_model(self):
+        """One DnnSuperResImpl per thread; the network object is not safe to share."""
+        model = getattr(self._thread_models, "model", None)
+        if model is None:
+            model = cv2.dnn_superres.DnnSuperResImpl_create()
+            model.readModel(self.model_path)
+            model.setModel(self.algorithm, self.model_scale)
+            self._thread_models.model = model
+        return model
+
+    def _lanczos_detail(self, rgb, new_size):
+        upscaled = cv2.resize(rgb, new_size, interpolation=cv2.INTER_LANCZOS4)
+        # Restore some of the high frequencies the interpolation smooths out (unsharp mask, radius ~1.5 px)
+        blurred = cv2.GaussianBlur(upscaled, (0, 0), 1.5)
+        for top in range(0, upscaled.shape[0], _STRIP_ROWS):
+            rows = slice(top, top + _STRIP_ROWS)
+            pixels = upscaled[rows].astype(np.float32)
+            pixels += 0.6 * (pixels - blurred[rows])
+            pixels += 0.5
+            np.clip(pixels, 0, 255, out=pixels)
+            upscaled[rows] = pixels
+        return upscaled
+
+    def upscale(self, image, scale=2.6):
+        """Upscales a PIL image by `scale`; the alpha channel is resized without sharpening."""
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGB")
+        pixels = np.asarray(image)
+        height, width = pixels.shape[:2]
+        new_size = (round(width * scale), round(height * scale))
+        rgb = np.ascontiguousarray(pixels[..., :3])
+
+        if self.dnn_available:
+            # The models expect BGR and upscale by a fixed factor; resample to the requested one
+            upscaled = self._dnn_model().upsample(cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+            upscaled = cv2.cvtColor(upscaled, cv2.COLOR_BGR2RGB)
+            if upscaled.shape[1::-1] != new_size:
+                interpolation = cv2.INTER_AREA if self.model_scale > scale else cv2.INTER_LANCZOS4
+                upscaled = cv2.resize(upscaled, new_size, interpolation=interpolation)
+        else:
+            upscaled = self._lanczos_detail(rgb, new_size)
+
+        if image.mode == "RGBA":
+            alpha = cv2.resize(pixels[..., 3], new_size, interpolation=cv2.INTER_LINEAR)
+            upscaled = np.dstack((upscaled, alpha))
+        return Image.fromarray(upscaled)
+
+
+class _EitherEvent:
+    """Looks set once any of its events is; the remote upscale only polls is_set()."""
+
+    def __init__(self, *events):
+        self.events = [event for event in events if event is not None]
+
+    def is_set(self):
+        return any(event.is_set() for event in self.events)
+
+
+def hedged_upscale(remote, local, hedge_after=OPTION2_HEDGE_SECONDS, cancel_event=None):
+    """
+    Runs remote(stop_event) and, if it has not produced a result after `hedge_after`
+    seconds (or failed earlier), local() as well. Returns (image, "remote" | "local")
+    from whichever succeeds first; a losing remote job sees stop_event set and is
+    cancelled. Setting `cancel_event` stops the remote job and skips the local one.
+    Raises the remote error if both fail.
+    """
+    lost_race = threading.Event()
+    remote_future = _hedge_executor.submit(remote, _EitherEvent(lost_race, cancel_event))
+    if hedge_after < 0:
+        return remote_future.result(), "remote"
+
+    wait([remote_future], timeout=hedge_after)
+    if remote_future.done() and remote_future.exception() is None:
+        return remote_future.result(), "remote"
+    if cancel_event is not None and cancel_event.is_set():
+        raise TimeoutError("Upscale cancelled")
+
+    print("Remote upscaler has not answered, starting the local upscaler...")
+    local_future = _hedge_executor.submit(local)
+    pending = {remote_future, local_future}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                lost_race.set()
+                return future.result(), "remote" if future is remote_future else "local"
+    raise remote_future.exception()
+
+
+upscaler = LocalUpscaler()
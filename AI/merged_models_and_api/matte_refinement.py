@@ -0,0 +1,90 @@
+import os
+import cv2
+import numpy as np
+from PIL import Image
+
+# "full" runs matting on the full-resolution crop, "proxy" on a downscaled copy
+MATTING_MODE = os.getenv("MATTING_MODE", "full")
+# Longest side of the downscaled copy used in proxy mode
+MATTE_PROXY_SIZE = int(os.getenv("MATTE_PROXY_SIZE", "1024"))
+# Half-width in full-resolution pixels of the edge band refined after upsampling
+MATTE_EDGE_BAND = int(os.getenv("MATTE_EDGE_BAND", "8"))
+MATTE_GUIDED_EPS = float(os.getenv("MATTE_GUIDED_EPS", "1e-4"))
+
+_TILE_SIZE = 256
+
+
+def guided_filter(guide, source, radius, eps):
+    """Edge-preserving guided filter (He et al.) on float32 single-channel arrays."""
+    size = (2 * radius + 1, 2 * radius + 1)
+    mean_guide = cv2.boxFilter(guide, -1, size)
+    mean_source = cv2.boxFilter(source, -1, size)
+    covariance = cv2.boxFilter(guide * source, -1, size) - mean_guide * mean_source
+    variance = cv2.boxFilter(guide * guide, -1, size) - mean_guide * mean_guide
+    a = covariance / (variance + eps)
+    b = mean_source - a * mean_guide
+    return cv2.boxFilter(a, -1, size) * guide + cv2.boxFilter(b, -1, size)
+
+
+def edge_band(alpha, radius):
+    """Pixels within radius of the object outline."""
+    hard = (alpha >= 0.5).astype(np.uint8)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * radius + 1, 2 * radius + 1))
+    return cv2.dilate(hard, kernel) != cv2.erode(hard, kernel)
+
+
+def refine_edges(image, alpha, radius=MATTE_EDGE_BAND, eps=MATTE_GUIDED_EPS):
+    """
+    Snaps an upsampled alpha matte to full-resolution image edges.
+    Only tiles that contain part of the edge band are filtered, so the cost
+    scales with the object outline rather than the image area.
+    """
+    band = edge_band(alpha, radius)
+    guide = np.asarray(image.convert("L"), dtype=np.float32) / 255
+    refined = alpha.copy()
+    height, width = alpha.shape
+    margin = 2 * radius
+
+    for top in range(0, height, _TILE_SIZE):
+        for left in range(0, width, _TILE_SIZE):
+            bottom, right = min(top + _TILE_SIZE, height), min(left + _TILE_SIZE, width)
+            tile_band = band[top:bottom, left:right]
+            if not tile_band.any():
+                continue
+            # Filter a slightly larger window so box sums are correct at the tile edge
+            y0, x0 = max(top - margin, 0), max(left - margin, 0)
+            y1, x1 = min(bottom + margin, height), min(right + margin, width)
+            filtered = guided_filter(guide[y0:y1, x0:x1], alpha[y0:y1, x0:x1], radius, eps)
+            filtered = filtered[top - y0:bottom - y0, left - x0:right - x0]
+            refined[top:bottom, left:right][tile_band] = filtered[tile_band]
+
+    return np.clip(refined, 0, 1)
+
+
+def predict_alpha(pool, image, mode=None, proxy_size=MATTE_PROXY_SIZE) -> Image.Image:
+    """
+    Returns the alpha matte ("L" image) for image using a rembg session pool.
+    In proxy mode the mask is predicted on a downscaled copy, upsampled, and only
+    the edge band is refined at full resolution.
+    """
+    mode = mode or MATTING_MODE
+    width, height = image.size
+    scale = proxy_size / max(width, height)
+    if mode == "full" or scale >= 1:
+        return pool.remove(image, only_mask=True)
+    if mode != "proxy":
+        raise ValueError(f"Unknown matting mode: {mode}")
+
+    small_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    small_mask = pool.remove(image.resize(small_size, Image.Resampling.BILINEAR), only_mask=True)
+
+    alpha = np.asarray(small_mask, dtype=np.float32) / 255
+    alpha = cv2.resize(alpha, (width, height), interpolation=cv2.INTER_LINEAR)
+    alpha = refine_edges(image, alpha)
+    return Image.fromarray(np.round(alpha * 255).astype(np.uint8))
+
+
+def cutout(image, alpha) -> Image.Image:
+    """Same RGBA composite rembg.remove produces from an image and its mask."""
+    empty = Image.new("RGBA", image.size, 0)
+    return Image.composite(image.convert("RGBA"), empty, alpha)
@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+from transformers import OwlViTProcessor, OwlViTForObjectDetection
+
+OWLVIT_MODEL_NAME = os.getenv("OWLVIT_MODEL_NAME", "google/owlvit-base-patch32")
+
+
+def current_rss_bytes():
+    """Returns the resident set size of this process in bytes (0 if unavailable)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class ModelRegistry:
+    """
+    Process-wide holder for the OwlViT processor and model.
+    Weights are loaded once per worker on first use and the same instances are
+    handed to every process_image object afterwards.
+    """
+
+    def __init__(self, model_name=OWLVIT_MODEL_NAME):
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._processor = None
+        self._model = None
+        self.load_seconds = None
+        self.rss_before_load = None
+        self.rss_after_load = None
+
+    def _load(self):
+        print(f"Loading OwlViT model '{self.model_name}'...")
+        self.rss_before_load = current_rss_bytes()
+        start = time.perf_counter()
+
+        processor = OwlViTProcessor.from_pretrained(self.model_name)
+        model = OwlViTForObjectDetection.from_pretrained(self.model_name)
+        model.eval()
+        for parameter in model.parameters():
+            parameter.requires_grad_(False)
+
+        self.load_seconds = time.perf_counter() - start
+        self.rss_after_load = current_rss_bytes()
+        self._processor = processor
+        self._model = model
+        print(f"OwlViT loaded in {self.load_seconds:.2f}s, "
+              f"RSS {self.rss_before_load / 2**20:.0f} MB -> {self.rss_after_load / 2**20:.0f} MB")
+
+    def get_owlvit(self):
+        """Returns the shared (processor, model) pair, loading it on first call."""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._load()
+        return self._processor, self._model
+
+    def is_loaded(self):
+        return self._model is not None
+
+    def stats(self) -> dict:
+        """Load time and memory figures for the health endpoint."""
+        stats = {
+            "model_name": self.model_name,
+            "loaded": self.is_loaded(),
+            "current_rss_mb": round(current_rss_bytes() / 2**20, 1),
+        }
+        if self.is_loaded():
+            stats["load_seconds"] = round(self.load_seconds, 3)
+            stats["rss_before_load_mb"] = round(self.rss_before_load / 2**20, 1)
+            stats["rss_after_load_mb"] = round(self.rss_after_load / 2**20, 1)
+        return stats
+
+
+# Shared by every process_image instance in this worker
+registry = ModelRegistry()
+
+
+def get_owlvit():
+    return registry.get_owlvit()
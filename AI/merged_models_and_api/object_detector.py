@@ -0,0 +1,157 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import torch
+from transformers.models.owlvit.modeling_owlvit import OwlViTObjectDetectionOutput
+import model_registry
+
+# "torch", "onnx" or "onnx-int8" (dynamic INT8 quantized ONNX)
+DETECTION_ENGINE = os.getenv("DETECTION_ENGINE", "torch")
+# Detect on a downscaled copy whose shorter side is at least this many pixels (0 disables)
+DETECTION_PROXY_SIZE = int(os.getenv("DETECTION_PROXY_SIZE", "768"))
+DETECTION_THRESHOLD = 0.2
+DETECTION_MIN_SCORE = 0.05
+
+
+def labels_key(labels: list) -> str:
+    """Stable hash of a label list, used as the text-embedding cache key."""
+    return hashlib.sha256("\n".join(labels).encode("utf-8")).hexdigest()
+
+
+class TextQueries:
+    """Pre-encoded OwlViT text queries for one label list."""
+
+    def __init__(self, labels, embeds, mask):
+        self.labels = labels
+        self.key = labels_key(labels)
+        self.embeds = embeds  # (1, num_queries, dim)
+        self.mask = mask      # (1, num_queries)
+
+
+class TextQueryCache:
+    """
+    Runs the OwlViT text tower once per label list and keeps the embeddings.
+    Per-tenant or per-category vocabularies each get their own entry.
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _encode(self, labels) -> TextQueries:
+        processor, model = model_registry.get_owlvit()
+        text_inputs = processor(text=[labels], return_tensors="pt")
+        with torch.inference_mode():
+            embeds = model.owlvit.get_text_features(
+                input_ids=text_inputs["input_ids"],
+                attention_mask=text_inputs["attention_mask"]
+            )
+        if not isinstance(embeds, torch.Tensor):
+            # Newer transformers return the projected features as pooler_output
+            embeds = embeds.pooler_output
+        embeds = embeds / torch.linalg.norm(embeds, ord=2, dim=-1, keepdim=True)
+        mask = text_inputs["input_ids"][..., 0] > 0
+        return TextQueries(labels, embeds.unsqueeze(0), mask.unsqueeze(0))
+
+    def get(self, labels: list) -> TextQueries:
+        key = labels_key(labels)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            # Encoding under the lock keeps concurrent first requests from
+            # running the text tower twice for the same vocabulary
+            queries = self._encode(labels)
+            self._entries[key] = queries
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return queries
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+query_cache = TextQueryCache()
+
+
+def run_heads(model, pixel_values, query_embeds, query_mask):
+    """Image tower plus class/box heads; shared by the torch path and the ONNX export."""
+    feature_map = model.image_embedder(pixel_values=pixel_values)[0]
+    batch_size, num_patches_h, num_patches_w, hidden_dim = feature_map.shape
+    image_feats = feature_map.reshape(batch_size, num_patches_h * num_patches_w, hidden_dim)
+
+    pred_logits, _ = model.class_predictor(image_feats, query_embeds, query_mask)
+    pred_boxes = model.box_predictor(image_feats, feature_map)
+    return pred_logits, pred_boxes
+
+
+def predict(pixel_values, queries: TextQueries, engine=None) -> OwlViTObjectDetectionOutput:
+    """
+    Runs only the image tower and the class/box heads against cached text queries.
+    Returns an output object accepted by post_process_grounded_object_detection.
+    engine is "torch", "onnx" or "onnx-int8" (defaults to DETECTION_ENGINE).
+    """
+    engine = engine or DETECTION_ENGINE
+    batch_size = pixel_values.shape[0]
+    query_embeds = queries.embeds.expand(batch_size, -1, -1)
+    query_mask = queries.mask.expand(batch_size, -1)
+
+    if engine == "torch":
+        _, model = model_registry.get_owlvit()
+        with torch.inference_mode():
+            pred_logits, pred_boxes = run_heads(model, pixel_values, query_embeds, query_mask)
+    elif engine in ("onnx", "onnx-int8"):
+        # onnxruntime is only needed when an ONNX engine is selected
+        import onnx_detection_engine
+        onnx_engine = onnx_detection_engine.get_engine(quantized=engine == "onnx-int8")
+        pred_logits, pred_boxes = onnx_engine.run(pixel_values, query_embeds, query_mask)
+    else:
+        raise ValueError(f"Unknown detection engine: {engine}")
+
+    return OwlViTObjectDetectionOutput(logits=pred_logits, pred_boxes=pred_boxes)
+
+
+def make_detection_proxy(image, min_side=DETECTION_PROXY_SIZE):
+    """
+    Cheap downscaled copy for detection.
+    OwlViT resizes its input to a fixed square (768 px for the base model), so
+    anything much larger only costs preprocessing time and memory. Image.reduce
+    is a box filter over integer blocks, much faster than a resampling resize.
+    Boxes are predicted in normalized coordinates, so passing the full-resolution
+    size to collect_boxes maps them straight back onto the original image.
+    """
+    if not min_side:
+        return image
+    factor = min(image.size) // min_side
+    if factor < 2:
+        return image
+    return image.reduce(factor)
+
+
+def collect_boxes(outputs, image_size, labels, threshold=DETECTION_THRESHOLD, min_score=DETECTION_MIN_SCORE):
+    """
+    Post-processes one image's detection output.
+    Returns (label_ids, valid_boxes, detected_labels) with boxes in image_size pixels.
+    """
+    processor, _ = model_registry.get_owlvit()
+    target_sizes = torch.tensor([image_size[::-1]])
+    results = processor.post_process_grounded_object_detection(
+        outputs=outputs,
+        target_sizes=target_sizes,
+        threshold=threshold
+    )[0]
+
+    valid_boxes = []
+    detected_labels = []
+    for score, label_id, box in zip(results["scores"], results["labels"], results["boxes"]):
+        if score < min_score:
+            continue
+        valid_boxes.append(box.tolist())
+        detected_labels.append(labels[label_id])
+    return results["labels"].tolist(), valid_boxes, detected_labels
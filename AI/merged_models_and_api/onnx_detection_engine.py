@@ -0,0 +1,139 @@
+import inspect
+import os
+import threading
+import time
+import numpy as np
+import onnxruntime as ort
+import torch
+import model_registry
+import object_detector
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join(script_dir, "onnx_models"))
+# 0 lets onnxruntime pick the thread count
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+
+
+class _OwlViTHeads(torch.nn.Module):
+    """Export wrapper: image tower and heads only, text queries are inputs."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values, query_embeds, query_mask):
+        return object_detector.run_heads(self.model, pixel_values, query_embeds, query_mask)
+
+
+def model_paths():
+    base = os.path.join(ONNX_MODEL_DIR, model_registry.OWLVIT_MODEL_NAME.replace("/", "__"))
+    return base + ".onnx", base + ".int8.onnx"
+
+
+def _staging_path(path):
+    # Unique per process and thread; keeps the .onnx suffix the exporters expect
+    return f"{path[:-len('.onnx')]}.{os.getpid()}.{threading.get_ident()}.tmp.onnx"
+
+
+def _single_file_kwargs() -> dict:
+    """
+    Keeps the weights inside the .onnx file (the model is far below the 2 GB protobuf limit).
+    The dynamo exporter otherwise writes them to a <name>.data sidecar that the model refers
+    to by its temporary name; older exporters have no such option and never split small models.
+    """
+    if "external_data" in inspect.signature(torch.onnx.export).parameters:
+        return {"external_data": False}
+    return {}
+
+
+def export_onnx(quantize=False) -> str:
+    """
+    Exports the registry's OwlViT model to ONNX (and optionally a dynamic INT8 copy).
+    Returns the path of the requested model. Files are written under a temporary name
+    and renamed, so another worker never opens a half-written model.
+    """
+    fp32_path, int8_path = model_paths()
+    os.makedirs(ONNX_MODEL_DIR, exist_ok=True)
+
+    if not os.path.exists(fp32_path):
+        _, model = model_registry.get_owlvit()
+        image_size = model.config.vision_config.image_size
+        pixel_values = torch.zeros(1, 3, image_size, image_size)
+        query_embeds = torch.zeros(1, 2, model.config.projection_dim)
+        query_mask = torch.ones(1, 2, dtype=torch.bool)
+
+        print(f"Exporting OwlViT to ONNX: {fp32_path}")
+        start = time.perf_counter()
+        temp_path = _staging_path(fp32_path)
+        try:
+            torch.onnx.export(
+                _OwlViTHeads(model).eval(),
+                (pixel_values, query_embeds, query_mask),
+                temp_path,
+                input_names=["pixel_values", "query_embeds", "query_mask"],
+                output_names=["logits", "pred_boxes"],
+                dynamic_axes={
+                    "pixel_values": {0: "batch"},
+                    "query_embeds": {0: "batch", 1: "queries"},
+                    "query_mask": {0: "batch", 1: "queries"},
+                    "logits": {0: "batch", 2: "queries"},
+                    "pred_boxes": {0: "batch"},
+                },
+                opset_version=17,
+                **_single_file_kwargs(),
+            )
+            os.replace(temp_path, fp32_path)
+        finally:
+            for leftover in (temp_path, temp_path + ".data"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        print(f"ONNX export finished in {time.perf_counter() - start:.1f}s")
+
+    if not quantize:
+        return fp32_path
+
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        print(f"Quantizing ONNX model to INT8: {int8_path}")
+        temp_path = _staging_path(int8_path)
+        try:
+            quantize_dynamic(fp32_path, temp_path, weight_type=QuantType.QInt8)
+            os.replace(temp_path, int8_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    return int8_path
+
+
+class OnnxDetectionEngine:
+    """Runs the exported OwlViT heads through ONNX Runtime on CPU."""
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_INTRA_OP_THREADS:
+            sess_options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+        self.session = ort.InferenceSession(model_path, sess_options, providers=["CPUExecutionProvider"])
+
+    def run(self, pixel_values, query_embeds, query_mask):
+        """Same inputs and outputs as object_detector.run_heads, as torch tensors."""
+        logits, pred_boxes = self.session.run(None, {
+            "pixel_values": np.ascontiguousarray(pixel_values.numpy(), dtype=np.float32),
+            "query_embeds": np.ascontiguousarray(query_embeds.numpy(), dtype=np.float32),
+            "query_mask": np.ascontiguousarray(query_mask.numpy()),
+        })
+        return torch.from_numpy(logits), torch.from_numpy(pred_boxes)
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(quantized=False) -> OnnxDetectionEngine:
+    """Returns the shared engine, exporting the model on first use."""
+    if quantized not in _engines:
+        with _engines_lock:
+            if quantized not in _engines:
+                _engines[quantized] = OnnxDetectionEngine(export_onnx(quantize=quantized))
+    return _engines[quantized]
@@ -0,0 +1,94 @@
+import numpy as np
+
+# ITU-R 601-2 luma weights, the same ones PIL uses for convert("L")
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+class PointOpChain:
+    """
+    Composes brightness, contrast and tone-curve steps into one 256-entry lookup table.
+    Every step maps each channel value independently, so any sequence of them is a
+    single LUT; applying it costs one Image.point (or one NumPy take) instead of
+    one full-image pass and allocation per step.
+
+        image = PointOpChain().brightness(1.2).contrast(1.1).apply(image)
+    """
+
+    def __init__(self):
+        self.steps = []
+
+    def brightness(self, factor: float):
+        """Same as ImageEnhance.Brightness(image).enhance(factor)."""
+        self.steps.append(("brightness", float(factor)))
+        return self
+
+    def contrast(self, factor: float):
+        """Same as ImageEnhance.Contrast(image).enhance(factor)."""
+        self.steps.append(("contrast", float(factor)))
+        return self
+
+    def tone_curve(self, curve):
+        """A 256-entry curve, or a function mapping a float array in 0-255 to 0-255."""
+        if callable(curve):
+            curve = curve(np.arange(256, dtype=np.float64))
+        curve = np.asarray(curve, dtype=np.float64)
+        if curve.shape != (256,):
+            raise ValueError("A tone curve needs exactly 256 entries.")
+        self.steps.append(("curve", curve))
+        return self
+
+    def needs_histogram(self) -> bool:
+        return any(kind == "contrast" for kind, _ in self.steps)
+
+    def build_lut(self, luma_histogram=None) -> np.ndarray:
+        """
+        Folds the steps into a uint8 LUT.
+        Contrast pivots around the mean luma of the image at that point in the chain,
+        as ImageEnhance.Contrast does; it is tracked by pushing the input's luma
+        histogram through the steps that came before it.
+        """
+        values = np.arange(256, dtype=np.float64)
+        histogram = None
+        if luma_histogram is not None:
+            histogram = np.asarray(luma_histogram[:256], dtype=np.float64)
+        elif self.needs_histogram():
+            raise ValueError("Contrast steps need the image's luma histogram.")
+
+        for kind, argument in self.steps:
+            if kind == "brightness":
+                values = values * argument
+            elif kind == "contrast":
+                mean = int((histogram * np.clip(np.round(values), 0, 255)).sum() / histogram.sum() + 0.5)
+                values = mean + argument * (values - mean)
+            else:
+                values = argument[np.clip(np.round(values), 0, 255).astype(np.intp)]
+            # Each ImageEnhance pass produces a uint8 image, so clip between steps too
+            values = np.clip(values, 0, 255)
+
+        return np.round(values).astype(np.uint8)
+
+    def lut_for(self, image) -> np.ndarray:
+        """LUT for a PIL image, computing its luma histogram only if a contrast step needs it."""
+        histogram = image.convert("L").histogram() if self.needs_histogram() else None
+        return self.build_lut(histogram)
+
+    def apply(self, image):
+        """Applies the whole chain to a PIL image in one Image.point call; alpha is left as is."""
+        if not self.steps:
+            return image
+        if image.mode not in ("L", "RGB", "RGBA"):
+            image = image.convert("RGB")
+        lut = self.lut_for(image).tolist()
+        identity = list(range(256))
+        tables = {"L": lut, "RGB": lut * 3, "RGBA": lut * 3 + identity}
+        return image.point(tables[image.mode])
+
+    def apply_array(self, pixels, luma_histogram=None) -> np.ndarray:
+        """Applies the chain to a uint8 array (H, W[, C]) with a single NumPy take."""
+        return np.take(self.build_lut(luma_histogram), pixels)
+
+
+def luma_histogram(rgb) -> np.ndarray:
+    """256-bin histogram of the rounded luma of a uint8 RGB array."""
+    luma = np.rint(rgb @ LUMA_WEIGHTS).astype(np.uint8)
+    return np.bincount(luma.ravel(), minlength=256)
@@ -0,0 +1,425 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+
+# Total decoded image memory all stored processors may hold
+PROCESSOR_MEMORY_BUDGET_MB = float(os.getenv("PROCESSOR_MEMORY_BUDGET_MB", "2048"))
+# Processors untouched for this long are dropped even when the budget is not reached
+PROCESSOR_IDLE_TTL_SECONDS = float(os.getenv("PROCESSOR_IDLE_TTL_SECONDS", "1800"))
+script_dir = os.path.dirname(os.path.abspath(__file__))
+# Idle processors are written here as raw .npy arrays and reloaded on the next access
+PROCESSOR_SPILL_DIR = os.getenv("PROCESSOR_SPILL_DIR", os.path.join(script_dir, "cache", "sessions"))
+# Seconds without access before a processor leaves RAM; negative disables spilling
+PROCESSOR_SPILL_AFTER_SECONDS = float(os.getenv("PROCESSOR_SPILL_AFTER_SECONDS", "120"))
+
+# Every attribute of process_image that can hold a full-resolution image
+IMAGE_ATTRIBUTES = (
+    "raw_image", "cropped_image", "alpha_matte", "no_background_image",
+    "enhanced_image_1", "enhanced_image_2", "enhanced_image_3", "chosen_image",
+)
+# Plain attributes saved next to the images when a processor is spilled
+STATE_ATTRIBUTES = (
+    "image_path", "raw_image_digest", "detected_objects", "crop_box", "description",
+    "option2_engine", "option3_planner", "option3_plan_source",
+)
+
+
+def image_nbytes(image) -> int:
+    """Decoded size of a PIL image in memory."""
+    if image is None:
+        return 0
+    width, height = image.size
+    bytes_per_band = 4 if image.mode in ("I", "F") else 1
+    return width * height * len(image.getbands()) * bytes_per_band
+
+
+def processor_nbytes(processor) -> int:
+    """Image bytes held by one processor; an image referenced twice (e.g. chosen_image) counts once."""
+    seen = {}
+    for name in IMAGE_ATTRIBUTES:
+        image = getattr(processor, name, None)
+        if image is not None:
+            seen[id(image)] = image
+    return sum(image_nbytes(image) for image in seen.values())
+
+
+def _json_default(value):
+    # Detection ids may still be tensors or NumPy scalars
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+class ProcessorStore:
+    """
+    Processors kept between the enhance and choose/description calls.
+    Entries are ordered by last access. On every insert and lookup:
+    - entries idle longer than the TTL are dropped, in RAM and on disk;
+    - entries idle longer than PROCESSOR_SPILL_AFTER_SECONDS are spilled to disk;
+    - the least recently used entries are spilled (or dropped, with spilling off)
+      until the decoded images left in RAM fit in the memory budget.
+    Spilled processors are raw .npy arrays plus a meta.json per processor id; they
+    are memory-mapped back into a fresh process_image on their next lookup, also by
+    another worker or after a restart. Sizes are measured at those points because
+    options are filled in lazily after insertion.
+    Spill files are written, read back and deleted after the lock is released, by
+    the thread whose call triggered them; a processor being spilled is still served
+    from RAM and a lookup in the meantime cancels its spill, while lookups of a
+    processor being read back wait for that read.
+    """
+
+    def __init__(self, budget_mb=PROCESSOR_MEMORY_BUDGET_MB, idle_ttl_seconds=PROCESSOR_IDLE_TTL_SECONDS,
+                 spill_dir=PROCESSOR_SPILL_DIR, spill_after_seconds=PROCESSOR_SPILL_AFTER_SECONDS):
+        self.budget_bytes = int(budget_mb * 2**20)
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.spill_dir = spill_dir
+        self.spill_after_seconds = spill_after_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # processor id -> processor, least recently used first
+        self._last_access = {}  # processor id -> wall-clock time, for entries in RAM and on disk
+        self._spilled = None  # ids on disk, scanned from spill_dir on first use
+        self._spilling = {}  # processor id -> (processor, token) while its files are written
+        self._pending_spills = []  # (processor id, processor, token, last access) to write once unlocked
+        self._pending_deletes = []  # spill directories to remove once unlocked
+        self._rehydrating = {}  # processor id -> {"done": threading.Event, "dropped": bool} while being read back
+        self.bytes_held = 0
+        self.evictions_budget = 0
+        self.evictions_idle = 0
+        self.released_bytes = 0
+        self.spills = 0
+        self.rehydrations = 0
+
+    @property
+    def spill_enabled(self):
+        return self.spill_after_seconds >= 0
+
+    def _spill_path(self, processor_id):
+        """Directory of a spilled processor, or None for ids that are not ours (never a path from user input)."""
+        try:
+            return os.path.join(self.spill_dir, str(uuid.UUID(processor_id)))
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+    def _load_spilled(self):
+        if self._spilled is not None:
+            return
+        self._spilled = set()
+        if not self.spill_enabled or not os.path.isdir(self.spill_dir):
+            return
+        for entry in os.scandir(self.spill_dir):
+            if not entry.is_dir() or self._spill_path(entry.name) is None:
+                if entry.is_dir() and (".spilling-" in entry.name or ".deleting-" in entry.name) \
+                        and time.time() - entry.stat().st_mtime > self.idle_ttl_seconds:
+                    # Staging or trash directory left behind by an interrupted worker
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                continue
+            meta_path = os.path.join(entry.path, "meta.json")
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                # Interrupted spill: no complete meta.json was ever written
+                shutil.rmtree(entry.path, ignore_errors=True)
+                continue
+            self._spilled.add(entry.name)
+            self._last_access[entry.name] = meta["last_access"]
+
+    def __contains__(self, processor_id):
+        with self._lock:
+            self._load_spilled()
+            return processor_id in self._last_access
+
+    def __len__(self):
+        if self._spilled is None:
+            with self._lock:
+                self._load_spilled()
+        # Every stored id has a last access time, in RAM, being spilled or on disk; read without the lock
+        return len(self._last_access)
+
+    def put(self, processor_id, processor):
+        with self._lock:
+            self._load_spilled()
+            self._spilling.pop(processor_id, None)
+            self._entries[processor_id] = processor
+            self._entries.move_to_end(processor_id)
+            self._last_access[processor_id] = time.time()
+            self._enforce_limits()
+        self._flush()
+
+    def get(self, processor_id):
+        """The processor for an id, reloaded from disk if it was spilled; None if it never existed or expired."""
+        while True:
+            rehydration = None
+            with self._lock:
+                self._load_spilled()
+                self._enforce_limits(keep=processor_id)
+                processor = self._entries.get(processor_id)
+                if processor is None and processor_id in self._spilling:
+                    # Still in RAM: cancel the spill, its writer discards the files
+                    processor, _ = self._spilling.pop(processor_id)
+                    self._entries[processor_id] = processor
+                    self.bytes_held += processor_nbytes(processor)
+                if processor is not None:
+                    self._entries.move_to_end(processor_id)
+                    self._last_access[processor_id] = time.time()
+                elif processor_id in self._rehydrating:
+                    rehydration = self._rehydrating[processor_id]
+                elif self.spill_enabled and self._spill_path(processor_id) is not None:
+                    # Claim the read; ids spilled by another worker are not in _spilled but may be on disk
+                    self._spilled.discard(processor_id)
+                    self._rehydrating[processor_id] = {"done": threading.Event(), "dropped": False}
+                    # Counts as used now, so idle eviction leaves it alone while it is read
+                    self._last_access[processor_id] = time.time()
+            self._flush()
+            if processor is not None:
+                return processor
+            if rehydration is not None:
+                # Another thread is reading it back; look again once it is done
+                rehydration["done"].wait()
+                continue
+            if processor_id not in self._rehydrating:
+                return None
+            return self._rehydrate(processor_id)
+
+    def remove(self, processor_id) -> bool:
+        with self._lock:
+            self._load_spilled()
+            if processor_id not in self._last_access:
+                return False
+            self._drop(processor_id)
+            self.bytes_held = sum(processor_nbytes(p) for p in self._entries.values())
+        self._flush()
+        return True
+
+    def release_intermediates(self, processor_id):
+        """Frees the images a processor no longer needs once an option has been chosen."""
+        with self._lock:
+            processor = self._entries.get(processor_id)
+            if processor is None:
+                return
+            before = processor_nbytes(processor)
+            processor.release_intermediates()
+            after = processor_nbytes(processor)
+            self.released_bytes += before - after
+            self.bytes_held -= before - after
+
+    def spill_all(self):
+        """Writes every idle processor to disk, e.g. before the worker shuts down."""
+        with self._lock:
+            self._load_spilled()
+            if not self.spill_enabled:
+                return
+            for processor_id in list(self._entries):
+                if not self._is_busy(self._entries[processor_id]):
+                    self._mark_spill(processor_id)
+            self.bytes_held = sum(processor_nbytes(p) for p in self._entries.values())
+        self._flush()
+
+    def _drop(self, processor_id):
+        """Forgets an id; must hold the lock. Its spill directory is deleted by the next _flush."""
+        if processor_id in self._spilled:
+            self._spilled.discard(processor_id)
+            self._discard_directory(self._spill_path(processor_id))
+        elif processor_id in self._spilling:
+            del self._spilling[processor_id]
+        elif processor_id in self._rehydrating:
+            # The reader discards what it loaded
+            self._rehydrating[processor_id]["dropped"] = True
+        else:
+            del self._entries[processor_id]
+        del self._last_access[processor_id]
+
+    @staticmethod
+    def _is_busy(processor):
+        """True while an option is still being computed; spilling then would lose its result."""
+        return any(lock.locked() for lock in getattr(processor, "_option_locks", {}).values())
+
+    def _discard_directory(self, directory):
+        """Renames a spill directory out of the way (cheap, under the lock); _flush deletes it."""
+        trash = f"{directory}.deleting-{uuid.uuid4().hex}"
+        try:
+            os.replace(directory, trash)
+        except OSError:
+            return
+        self._pending_deletes.append(trash)
+
+    def _mark_spill(self, processor_id):
+        """Moves an entry out of RAM accounting; must hold the lock. Its files are written by the next _flush."""
+        if self._spill_path(processor_id) is None:
+            return False
+        processor = self._entries.pop(processor_id)
+        token = object()
+        self._spilling[processor_id] = (processor, token)
+        self._pending_spills.append((processor_id, processor, token, self._last_access[processor_id]))
+        return True
+
+    def _flush(self):
+        """Writes and deletes the spill files queued under the lock, without holding it."""
+        with self._lock:
+            spills, self._pending_spills = self._pending_spills, []
+            deletes, self._pending_deletes = self._pending_deletes, []
+        for directory in deletes:
+            shutil.rmtree(directory, ignore_errors=True)
+        for processor_id, processor, token, last_access in spills:
+            self._write_spill(processor_id, processor, token, last_access)
+
+    def _write_spill(self, processor_id, processor, token, last_access):
+        directory = self._spill_path(processor_id)
+        # Written to a staging directory and renamed, so a reader never sees half a spill
+        staging = f"{directory}.spilling-{uuid.uuid4().hex}"
+        try:
+            os.makedirs(staging)
+            images = {}
+            written = {}  # id(image) -> attribute it was written as
+            for name in IMAGE_ATTRIBUTES:
+                image = getattr(processor, name, None)
+                if image is None:
+                    continue
+                if id(image) in written:
+                    images[name] = {"same_as": written[id(image)]}
+                    continue
+                if image.mode not in ("L", "RGB", "RGBA"):
+                    image = image.convert("RGBA")
+                np.save(os.path.join(staging, f"{name}.npy"), np.asarray(image))
+                images[name] = {"mode": image.mode}
+                written[id(getattr(processor, name))] = name
+
+            meta = {
+                "last_access": last_access,
+                "images": images,
+                "state": {name: getattr(processor, name, None) for name in STATE_ATTRIBUTES},
+            }
+            with open(os.path.join(staging, "meta.json"), "w") as f:
+                json.dump(meta, f, default=_json_default)
+        except Exception as e:
+            print(f"Could not spill processor {processor_id}, evicting it: {str(e)}")
+            shutil.rmtree(staging, ignore_errors=True)
+            with self._lock:
+                if self._spilling.get(processor_id, (None, None))[1] is token:
+                    del self._spilling[processor_id]
+                    del self._last_access[processor_id]
+                    self.evictions_budget += 1
+            return
+
+        with self._lock:
+            current = self._spilling.get(processor_id)
+            completed = current is not None and current[1] is token
+            if completed:
+                del self._spilling[processor_id]
+                # A leftover directory for the same id would block the rename
+                self._discard_directory(directory)
+                os.replace(staging, directory)
+                self._spilled.add(processor_id)
+                self.spills += 1
+        if not completed:
+            # Looked up or removed while being written
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def _read_spill(self, directory):
+        """Builds a process_image from a spill directory, or None if there is no complete spill."""
+        try:
+            with open(os.path.join(directory, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        from process_image import process_image
+        processor = process_image()
+        for name, info in meta["images"].items():
+            if "same_as" in info:
+                image = getattr(processor, info["same_as"])
+            else:
+                # L and RGBA images keep using the mapped pages; PIL copies RGB ones into its own buffer
+                image = Image.fromarray(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r"))
+                image.load()
+            setattr(processor, name, image)
+        for name, value in meta["state"].items():
+            setattr(processor, name, tuple(value) if name == "crop_box" and value is not None else value)
+        return processor
+
+    def _rehydrate(self, processor_id):
+        """Reads a claimed spill back without holding the lock, then files it under the lock."""
+        directory = self._spill_path(processor_id)
+        try:
+            processor = self._read_spill(directory)
+        except Exception as e:
+            print(f"Could not reload processor {processor_id}: {str(e)}")
+            processor = None
+
+        with self._lock:
+            rehydration = self._rehydrating.pop(processor_id)
+            if processor is not None and (rehydration["dropped"] or processor_id in self._entries):
+                # Evicted or removed while it was being read, or replaced by a put
+                processor = self._entries.get(processor_id)
+                self._discard_directory(directory)
+            elif processor is not None:
+                # Mapped pages stay readable after the files are moved and unlinked
+                self._discard_directory(directory)
+                self._entries[processor_id] = processor
+                self._last_access[processor_id] = time.time()
+                self.bytes_held += processor_nbytes(processor)
+                self.rehydrations += 1
+            elif processor_id in self._last_access and not rehydration["dropped"]:
+                # Listed as spilled but unreadable: forget it
+                del self._last_access[processor_id]
+            rehydration["done"].set()
+        self._flush()
+        return processor
+
+    def _enforce_limits(self, keep=None):
+        """Evicts and marks spills; must hold the lock. `keep` is an id about to be used, never spilled."""
+        now = time.time()
+        for processor_id in list(self._last_access):
+            if now - self._last_access[processor_id] > self.idle_ttl_seconds:
+                print(f"Evicting processor {processor_id}: idle for {now - self._last_access[processor_id]:.0f}s")
+                self._drop(processor_id)
+                self.evictions_idle += 1
+
+        if self.spill_enabled:
+            for processor_id in list(self._entries):
+                idle_seconds = now - self._last_access[processor_id]
+                if (processor_id != keep and idle_seconds > self.spill_after_seconds
+                        and not self._is_busy(self._entries[processor_id])):
+                    self._mark_spill(processor_id)
+
+        sizes = {processor_id: processor_nbytes(p) for processor_id, p in self._entries.items()}
+        self.bytes_held = sum(sizes.values())
+        # Keep at least the most recent entry: it is the one being worked on
+        for processor_id in list(self._entries)[:-1]:
+            if self.bytes_held <= self.budget_bytes:
+                break
+            if processor_id == keep:
+                continue
+            if self.spill_enabled and not self._is_busy(self._entries[processor_id]) and self._mark_spill(processor_id):
+                print(f"Spilling processor {processor_id}: memory budget of {self.budget_bytes / 2**20:.0f} MB reached")
+            else:
+                print(f"Evicting processor {processor_id}: memory budget of {self.budget_bytes / 2**20:.0f} MB reached")
+                self._drop(processor_id)
+                self.evictions_budget += 1
+            self.bytes_held -= sizes[processor_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "spilled_entries": len(self._spilled) if self._spilled is not None else None,
+                "spilling_entries": len(self._spilling),
+                "bytes_held": self.bytes_held,
+                "budget_bytes": self.budget_bytes,
+                "idle_ttl_seconds": self.idle_ttl_seconds,
+                "spill_after_seconds": self.spill_after_seconds,
+                "evictions_budget": self.evictions_budget,
+                "evictions_idle": self.evictions_idle,
+                "released_bytes": self.released_bytes,
+                "spills": self.spills,
+                "rehydrations": self.rehydrations,
+            }
+
+
+processors = ProcessorStore()
@@ -0,0 +1,152 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+import onnxruntime as ort
+from rembg import new_session, remove
+
+REMBG_MODEL = os.getenv("REMBG_MODEL", "u2net")
+# Matting tiers clients can choose per request: speed vs. edge quality
+MATTING_TIERS = {
+    "fast": os.getenv("REMBG_FAST_MODEL", "u2netp"),
+    "default": REMBG_MODEL,
+    "quality": os.getenv("REMBG_QUALITY_MODEL", "isnet-general-use"),
+}
+# One session per thread that may run background removal at the same time, per tier
+REMBG_POOL_SIZE = int(os.getenv("REMBG_POOL_SIZE", "2"))
+# Split the cores between the pooled sessions so they never oversubscribe the CPU
+REMBG_INTRA_OP_THREADS = int(os.getenv(
+    "REMBG_INTRA_OP_THREADS", str(max(1, (os.cpu_count() or 1) // REMBG_POOL_SIZE))
+))
+# Seconds before a tier whose model failed to load is tried again
+REMBG_TIER_RETRY_SECONDS = float(os.getenv("REMBG_TIER_RETRY_SECONDS", "300"))
+
+# Every tier has its own sessions, but only REMBG_POOL_SIZE inferences run at once across
+# all tiers, so the intra-op thread split above holds when several tiers are busy
+_inference_slots = threading.BoundedSemaphore(REMBG_POOL_SIZE)
+
+
+class TierUnavailable(Exception):
+    """Raised for a matting tier whose model could not be loaded."""
+
+
+class SessionPool:
+    """
+    Fixed set of pre-created rembg sessions for one model.
+    Callers borrow a session for the duration of one remove() call and give it
+    back afterwards, so no request pays session construction.
+    """
+
+    def __init__(self, model_name=REMBG_MODEL, size=REMBG_POOL_SIZE, intra_op_threads=REMBG_INTRA_OP_THREADS):
+        self.model_name = model_name
+        self.size = size
+        self.intra_op_threads = intra_op_threads
+        self._sessions = queue.Queue()
+        self._start_lock = threading.Lock()
+        self._started = False
+        self.error = None
+        self._failed_at = None
+        self.load_seconds = None
+        self._metrics_lock = threading.Lock()
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def _new_session(self):
+        sess_opts = ort.SessionOptions()
+        sess_opts.intra_op_num_threads = self.intra_op_threads
+        sess_opts.inter_op_num_threads = 1
+        return new_session(self.model_name, sess_opts=sess_opts)
+
+    @property
+    def available(self) -> bool:
+        """False for a while after the model failed to load (download or ONNX errors)."""
+        return self._failed_at is None or time.monotonic() - self._failed_at >= REMBG_TIER_RETRY_SECONDS
+
+    def start(self):
+        """Creates every session up front; safe to call more than once. Raises TierUnavailable on failure."""
+        if self._started:
+            return
+        with self._start_lock:
+            if self._started:
+                return
+            if not self.available:
+                raise TierUnavailable(f"rembg model '{self.model_name}' failed to load: {self.error}")
+            print(f"Creating {self.size} rembg '{self.model_name}' sessions "
+                  f"({self.intra_op_threads} intra-op threads each)...")
+            start = time.perf_counter()
+            try:
+                sessions = [self._new_session() for _ in range(self.size)]
+            except Exception as e:
+                self.error = str(e)
+                self._failed_at = time.monotonic()
+                raise TierUnavailable(f"rembg model '{self.model_name}' failed to load: {self.error}") from e
+            for session in sessions:
+                self._sessions.put(session)
+            self.load_seconds = time.perf_counter() - start
+            self.error = None
+            self._failed_at = None
+            self._started = True
+
+    @contextmanager
+    def session(self):
+        """Borrows a session and an inference slot, blocking until both are free."""
+        self.start()
+        with _inference_slots:
+            session = self._sessions.get()
+            try:
+                yield session
+            finally:
+                self._sessions.put(session)
+
+    def remove(self, image, **kwargs):
+        """rembg.remove with a pooled session; records the call latency for this model."""
+        with self.session() as session:
+            start = time.perf_counter()
+            result = remove(image, session=session, **kwargs)
+            elapsed = time.perf_counter() - start
+        with self._metrics_lock:
+            self.calls += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+        return result
+
+    def stats(self) -> dict:
+        with self._metrics_lock:
+            return {
+                "model_name": self.model_name,
+                "size": self.size,
+                "available": self._sessions.qsize(),
+                "intra_op_threads": self.intra_op_threads,
+                "started": self._started,
+                "error": self.error,
+                "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+                "calls": self.calls,
+                "avg_latency_ms": round(self.total_seconds / self.calls * 1000, 1) if self.calls else 0,
+                "max_latency_ms": round(self.max_seconds * 1000, 1),
+            }
+
+
+pools = {tier: SessionPool(model_name) for tier, model_name in MATTING_TIERS.items()}
+
+
+def get_pool(tier="default") -> SessionPool:
+    if tier not in pools:
+        raise ValueError(f"Unknown matting tier: {tier}. Choose one of {', '.join(pools)}.")
+    if not pools[tier].available:
+        raise TierUnavailable(f"Matting tier '{tier}' is unavailable: {pools[tier].error}")
+    return pools[tier]
+
+
+def start_all():
+    """Preloads the sessions of every tier; a tier that fails is reported and left unavailable."""
+    for tier, tier_pool in pools.items():
+        try:
+            tier_pool.start()
+        except TierUnavailable as e:
+            print(f"Matting tier '{tier}' disabled: {str(e)}")
+
+
+def stats() -> dict:
+    return {tier: tier_pool.stats() for tier, tier_pool in pools.items()}
@@ -1,15 +1,36 @@
 from process_image import process_image
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Dict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import asyncio
+import time
+import json
 import shutil
 import os
+import threading
 import base64
 from io import BytesIO
 from PIL import Image
 import uuid
 from search_product import search_product
+import model_registry
+import object_detector
+import detection_vocabulary
+import detection_batcher
+import rembg_session_pool
+import disk_cache
+import enhancement_plan_cache
+import enhancement_planner
+import finegrain_client_pool
+import temp_artifacts
+import local_upscaler
+import processor_store
+import enhancement_jobs
+import execution
+import image_delivery
 
 app = FastAPI()
 
@@ -22,12 +43,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Store active processors
-processors = {}
+# Active processors, bounded by memory budget and idle time
+processors = processor_store.processors
+
+# Per-option deadlines in seconds; options 2 and 3 wait on remote services
+OPTION_DEADLINES = {
+    1: float(os.getenv("OPTION1_DEADLINE_SECONDS", "30")),
+    2: float(os.getenv("OPTION2_DEADLINE_SECONDS", "90")),
+    3: float(os.getenv("OPTION3_DEADLINE_SECONDS", "45")),
+}
+option_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("OPTION_WORKERS", "12")), thread_name_prefix="enhance-option"
+)
+
+@app.on_event("startup")
+async def load_models():
+    """Load the shared detection model once per worker before serving requests"""
+    model_registry.get_owlvit()
+    object_detector.query_cache.get(detection_vocabulary.DEFAULT_LABELS)
+    if object_detector.DETECTION_ENGINE != "torch":
+        # Export/quantize now rather than inside the detection batcher on the first request
+        import onnx_detection_engine
+        onnx_detection_engine.get_engine(quantized=object_detector.DETECTION_ENGINE == "onnx-int8")
+    rembg_session_pool.start_all()
+    temp_artifacts.cleanup_stale()
+    # The Space config is fetched over the network; connect in the background so startup never waits on it
+    threading.Thread(target=finegrain_client_pool.client_pool.start, daemon=True).start()
+
+@app.on_event("shutdown")
+def spill_processors():
+    """Write idle sessions to disk so a restarted worker can pick them up"""
+    processors.spill_all()
+    execution.shutdown()
 
 class ImageEnhancementRequest(BaseModel):
     image_path: str
     background: str
+    detection_vocabulary: str = "default"
+    matting_tier: str = "default"  # "fast", "default" or "quality"
+    matting_mode: Optional[str] = None  # "full" or "proxy", defaults to MATTING_MODE
+    option_deadlines: Optional[Dict[int, float]] = None  # seconds per option, overrides OPTION_DEADLINES
+    lazy_options: bool = False  # only detect and remove the background; options are fetched on demand
+    option3_planner: Optional[str] = None  # "llm", "local" or "auto", defaults to OPTION3_PLANNER
 
 class ImageSelectionRequest(BaseModel):
     image_path: str
@@ -45,6 +102,60 @@ def pil_image_to_base64(pil_image):
     img_str = base64.b64encode(buffer.getvalue()).decode()
     return f"data:image/jpeg;base64,{img_str}"
 
+def run_enhancement_options(img_processor, deadlines=None, on_option=None, cancel_event=None) -> dict:
+    """
+    Run the three enhancement options concurrently, each bounded by its own deadline.
+    on_option(number, status) is called as soon as each option completes, fails, times out or is cancelled.
+    """
+    deadlines = {**OPTION_DEADLINES, **(deadlines or {})}
+    started = time.monotonic()
+    futures = {
+        option_executor.submit(img_processor.get_option, number): number
+        for number in (1, 2, 3)
+    }
+
+    option_status = {}
+    pending = set(futures)
+    while pending:
+        elapsed = time.monotonic() - started
+        wait_seconds = max(0, min(deadlines[futures[future]] for future in pending) - elapsed)
+        if cancel_event is not None:
+            # Wake up regularly to notice a cancelled job
+            wait_seconds = min(wait_seconds, 0.5)
+        done, pending = wait(pending, timeout=wait_seconds, return_when=FIRST_COMPLETED)
+
+        settled = []
+        for future in done:
+            number = futures[future]
+            try:
+                future.result()
+                option_status[number] = "completed"
+                print(f"Enhancement option {number} completed")
+            except Exception as e:
+                # Left unset so /processor/{id}/option/{n} and /image/option_{n} retry it
+                option_status[number] = "failed"
+                print(f"Enhancement option {number} failed: {str(e)}")
+            settled.append(number)
+
+        elapsed = time.monotonic() - started
+        for future in list(pending):
+            number = futures[future]
+            # The option keeps running in the background and lands on the processor when done
+            if cancel_event is not None and cancel_event.is_set():
+                option_status[number] = "cancelled"
+            elif elapsed >= deadlines[number]:
+                option_status[number] = "timeout"
+                print(f"Enhancement option {number} timed out after {deadlines[number]}s")
+            else:
+                continue
+            pending.discard(future)
+            settled.append(number)
+
+        if on_option is not None:
+            for number in sorted(settled):
+                on_option(number, option_status[number])
+    return {number: option_status[number] for number in (1, 2, 3)}
+
 def apply_background(image: Image.Image, background: str) -> Image.Image:
     """Apply a given base64 background image to an RGBA image"""
     if image.mode != 'RGBA':
@@ -87,111 +198,249 @@ async def upload_image(image: UploadFile = File(...)):
         file_path = os.path.join(upload_dir, unique_filename)
         
         # Save the uploaded file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
+        def save_upload():
+            with open(file_path, "wb") as buffer:
+                shutil.copyfileobj(image.file, buffer)
+        await execution.run_blocking(save_upload)
         
         return {"file_path": file_path, "filename": unique_filename}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
 
+def resolve_enhancement_request(request: ImageEnhancementRequest) -> str:
+    """Validate an enhancement request and return the image path to process"""
+    if request.detection_vocabulary not in detection_vocabulary.VOCABULARIES:
+        raise HTTPException(status_code=400, detail=f"Unknown detection vocabulary: {request.detection_vocabulary}")
+    if request.matting_tier not in rembg_session_pool.MATTING_TIERS:
+        raise HTTPException(status_code=400, detail=f"Unknown matting tier: {request.matting_tier}")
+    if not rembg_session_pool.pools[request.matting_tier].available:
+        raise HTTPException(status_code=503, detail=f"Matting tier '{request.matting_tier}' is unavailable, try another tier")
+    if request.matting_mode not in (None, "full", "proxy"):
+        raise HTTPException(status_code=400, detail=f"Unknown matting mode: {request.matting_mode}")
+    if request.option3_planner not in (None, *enhancement_planner.PLANNERS):
+        raise HTTPException(status_code=400, detail=f"Unknown option 3 planner: {request.option3_planner}")
+
+    # Check if the image path is absolute or relative
+    if os.path.isabs(request.image_path):
+        # If absolute path, convert to relative from the script directory
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        relative_path = os.path.relpath(request.image_path, script_dir)
+        image_path_to_use = relative_path
+    else:
+        # If relative path, use as is
+        image_path_to_use = request.image_path
+    
+    print(f"Using image path: {image_path_to_use}")
+    
+    # Check if file exists before processing
+    full_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), image_path_to_use)
+    if not os.path.exists(full_path):
+        raise HTTPException(status_code=404, detail=f"Image file not found: {full_path}")
+    return image_path_to_use
+
+def prepare_processor(request: ImageEnhancementRequest, image_path_to_use: str, report_stage=None) -> process_image:
+    """Steps 1-3: load the image, detect the product and cut it out onto the requested background"""
+    report_stage = report_stage or (lambda stage: None)
+    img_processor = process_image()
+    img_processor.option3_planner = request.option3_planner
+    
+    # Process the image step by step with error handling
+    report_stage("analyzing")
+    print("Step 1: Processing image...")
+    img_processor.process(image_path_to_use)
+    
+    img_processor.raw_image.save("processed_image.png")  # Save processed image for debugging
+    
+    report_stage("detecting")
+    print("Step 2: Detecting objects...")
+    img_processor.detect_object(request.detection_vocabulary)
+    
+    img_processor.cropped_image.save("detected_objects_image.png")  # Save detected objects image for debugging
+    print(img_processor.detected_objects)
+    
+    report_stage("removing_background")
+    print("Step 3: Removing background...")
+    img_processor.remove_background(request.matting_tier, request.matting_mode)
+    
+    img_processor.no_background_image = apply_background(img_processor.no_background_image, request.background)
+    
+    img_processor.no_background_image.save("no_background_image.png")  # Save no background image for debugging
+    return img_processor
+
 @app.post("/enhance_and_return_all_options")
 async def enhance_image(request: ImageEnhancementRequest):
     """Process image through all enhancement options"""
     try:
         print(f"Starting enhancement for image: {request.image_path}")
-        background_color = request.background
-        print(f"Using background color: {background_color}")
+        image_path_to_use = resolve_enhancement_request(request)
+        
         # Create a new processor instance
         processor_id = str(uuid.uuid4())
-        img_processor = process_image()
-        
-        # Check if the image path is absolute or relative
-        if os.path.isabs(request.image_path):
-            # If absolute path, convert to relative from the script directory
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            relative_path = os.path.relpath(request.image_path, script_dir)
-            image_path_to_use = relative_path
-        else:
-            # If relative path, use as is
-            image_path_to_use = request.image_path
-        
-        print(f"Using image path: {image_path_to_use}")
-        
-        # Check if file exists before processing
-        full_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), image_path_to_use)
-        if not os.path.exists(full_path):
-            raise HTTPException(status_code=404, detail=f"Image file not found: {full_path}")
-        
-        # Process the image step by step with error handling
-        print("Step 1: Processing image...")
-        img_processor.process(image_path_to_use)
-        
-        img_processor.raw_image.save("processed_image.png")  # Save processed image for debugging
+        img_processor = await execution.run_blocking(prepare_processor, request, image_path_to_use)
         
-        print("Step 2: Detecting objects...")
-        img_processor.detect_object()
-        
-        img_processor.cropped_image.save("detected_objects_image.png")  # Save detected objects image for debugging
-        print(img_processor.detected_objects)
-        
-        print("Step 3: Removing background...")
-        img_processor.remove_background()
-        
-        img_processor.no_background_image = apply_background(img_processor.no_background_image, background_color)
-        
-        img_processor.no_background_image.save("no_background_image.png")  # Save no background image for debugging
-        
-        print("Step 4: Enhancement option 1...")
-        try:
-            img_processor.enhance_image_option1()
-            print("Enhancement option 1 completed")
-        except Exception as e:
-            print(f"Enhancement option 1 failed: {str(e)}")
-            # Set a placeholder or skip this enhancement
-            img_processor.enhanced_image_1 = img_processor.no_background_image
-        
-        print("Step 5: Enhancement option 2...")
-        try:
-            img_processor.enhance_image_option2()
-            print("Enhancement option 2 completed")
-        except Exception as e:
-            print(f"Enhancement option 2 failed: {str(e)}")
-            # Set a placeholder or skip this enhancement
-            img_processor.enhanced_image_2 = img_processor.no_background_image
-        
-        print("Step 6: Enhancement option 3...")
-        try:
-            img_processor.enhance_image_option3()
-            print("✓ Enhancement option 3 completed")
-        except Exception as e:
-            print(f"Enhancement option 3 failed: {str(e)}")
-            # Set a placeholder or skip this enhancement
-            img_processor.enhanced_image_3 = img_processor.no_background_image
+        if request.lazy_options:
+            # Options are computed by GET /processor/{id}/option/{n} when first requested
+            await execution.run_blocking(processors.put, processor_id, img_processor)
+            print(f"Detection and background removal completed. Processor ID: {processor_id}")
+            return {
+                "processor_id": processor_id,
+                "option_status": {1: "pending", 2: "pending", 3: "pending"},
+                "original_image_url": image_delivery.image_url(processor_id, "original"),
+                "no_background_image_url": image_delivery.image_url(processor_id, "no_background")
+            }
+
+        print("Step 4: Running enhancement options 1-3 concurrently...")
+        option_status = await execution.run_blocking(run_enhancement_options, img_processor, request.option_deadlines)
         
         # Store the processor for later use
-        processors[processor_id] = img_processor
+        await execution.run_blocking(processors.put, processor_id, img_processor)
         print(f"Enhancement completed successfully. Processor ID: {processor_id}")
         
-        # Convert PIL images to base64 for JSON response
+        # Images are fetched separately from GET /processor/{id}/image/{kind}
         return {
             "processor_id": processor_id,
-            "enhanced_image_1": pil_image_to_base64(img_processor.enhanced_image_1),
-            "enhanced_image_2": pil_image_to_base64(img_processor.enhanced_image_2),
-            "enhanced_image_3": pil_image_to_base64(img_processor.enhanced_image_3),
-            "original_image": pil_image_to_base64(img_processor.raw_image),
-            "no_background_image": pil_image_to_base64(img_processor.no_background_image)
+            "enhanced_image_1_url": image_delivery.option_url(processor_id, 1, option_status),
+            "enhanced_image_2_url": image_delivery.option_url(processor_id, 2, option_status),
+            "enhanced_image_3_url": image_delivery.option_url(processor_id, 3, option_status),
+            "option_status": option_status,
+            "option2_engine": img_processor.option2_engine,
+            "option3_planner": img_processor.option3_plan_source,
+            "original_image_url": image_delivery.image_url(processor_id, "original"),
+            "no_background_image_url": image_delivery.image_url(processor_id, "no_background")
         }
     
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
+    except rembg_session_pool.TierUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"Error during enhancement: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error enhancing image: {str(e)}")
 
+def run_enhancement_job(job, request: ImageEnhancementRequest, image_path_to_use: str) -> dict:
+    """Job version of /enhance_and_return_all_options that emits every result as soon as it exists"""
+    try:
+        img_processor = prepare_processor(request, image_path_to_use, job.set_stage)
+        job.check_cancelled()
+        # Lets a cancelled job also cancel its remote Finegrain upscale
+        img_processor.cancel_event = job.cancel_event
+        processors.put(job.processor_id, img_processor)
+        job.emit("images", {
+            "processor_id": job.processor_id,
+            "original_image_url": image_delivery.image_url(job.processor_id, "original"),
+            "no_background_image_url": image_delivery.image_url(job.processor_id, "no_background")
+        })
+
+        if request.lazy_options:
+            return {"processor_id": job.processor_id, "option_status": {1: "pending", 2: "pending", 3: "pending"}}
+
+        job.set_stage("enhancing")
+
+        def emit_option(number, status):
+            job.emit("option", {
+                "option_number": number,
+                "status": status,
+                "image_url": image_delivery.option_url(job.processor_id, number, {number: status}),
+                "option2_engine": img_processor.option2_engine if number == 2 else None,
+                "option3_planner": img_processor.option3_plan_source if number == 3 else None
+            })
+
+        option_status = run_enhancement_options(img_processor, request.option_deadlines, emit_option, job.cancel_event)
+        job.check_cancelled()
+        print(f"Enhancement job {job.id} completed. Processor ID: {job.processor_id}")
+        return {
+            "processor_id": job.processor_id,
+            "option_status": option_status,
+            "option2_engine": img_processor.option2_engine,
+            "option3_planner": img_processor.option3_plan_source
+        }
+    except enhancement_jobs.JobCancelled:
+        processors.remove(job.processor_id)
+        raise
+
+@app.post("/jobs/enhance")
+async def submit_enhancement_job(request: ImageEnhancementRequest):
+    """Queue the enhancement pipeline and return a job id right away; progress comes from /jobs/{id}/events"""
+    image_path_to_use = resolve_enhancement_request(request)
+    try:
+        job = enhancement_jobs.jobs.submit(run_enhancement_job, request, image_path_to_use)
+    except enhancement_jobs.QueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Too many enhancement jobs, try again later: {str(e)}")
+    return {
+        "job_id": job.id,
+        "processor_id": job.processor_id,
+        "status": job.status,
+        "events_url": f"/jobs/{job.id}/events"
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_enhancement_job(job_id: str):
+    """Current status of an enhancement job"""
+    job = enhancement_jobs.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.snapshot()
+
+@app.delete("/jobs/{job_id}")
+async def cancel_enhancement_job(job_id: str):
+    """Cancel a queued or running enhancement job"""
+    job = enhancement_jobs.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not enhancement_jobs.jobs.cancel(job_id):
+        return {"message": f"Job already {job.status}", "status": job.status}
+    return {"message": "Job cancellation requested", "status": job.status}
+
+@app.get("/jobs/{job_id}/events")
+async def stream_enhancement_job(job_id: str, request: Request):
+    """
+    Server-Sent Events for one job: queued, stage, images, option (one per option), then
+    completed, failed or cancelled. Reconnecting clients resume after Last-Event-ID.
+    """
+    job = enhancement_jobs.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    try:
+        last_event_id = int(request.headers.get("last-event-id") or 0)
+    except ValueError:
+        last_event_id = 0
+
+    async def event_stream():
+        last_id = last_event_id
+        # Set by job.emit from the worker thread; waiting on it holds no thread
+        wakeup = job.subscribe()
+        try:
+            while not await request.is_disconnected():
+                wakeup.clear()
+                events = job.events_after(last_id, 0)
+                if not events:
+                    if job.status in enhancement_jobs.TERMINAL_STATUSES:
+                        # Reconnected after the final event: nothing more will come
+                        return
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), 15.0)
+                    except asyncio.TimeoutError:
+                        # Comment line keeps proxies from closing an idle stream
+                        yield ": keep-alive\n\n"
+                    continue
+                for event in events:
+                    last_id = event["id"]
+                    yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+                    if event["event"] in enhancement_jobs.TERMINAL_STATUSES:
+                        return
+        finally:
+            job.unsubscribe(wakeup)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/choose_image_and_generate_description")
 async def choose_image_and_generate_description(
     processor_id: str,
@@ -200,31 +449,97 @@ async def choose_image_and_generate_description(
     """Choose an enhanced image option and generate description"""
     try:
         # Get the processor instance
-        if processor_id not in processors:
+        img_processor = await execution.run_blocking(processors.get, processor_id)
+        if img_processor is None:
             raise HTTPException(status_code=404, detail="Processor not found. Please enhance image first.")
         
-        img_processor = processors[processor_id]
-        
-        # Choose the image
-        img_processor.choose_image(option_number)
-        
-        # Generate description
-        description = img_processor.generate_description()
-        
-        return {
-            "chosen_image": pil_image_to_base64(img_processor.chosen_image),
-            "description": description,
-            "option_number": option_number
-        }
+        def choose_and_describe():
+            # Choose the image
+            img_processor.choose_image(option_number)
+            
+            # Generate description
+            description = img_processor.generate_description()
+            processors.release_intermediates(processor_id)
+            
+            return {
+                # The chosen image is the option's image, which the client has usually fetched already
+                "chosen_image_url": image_delivery.image_url(processor_id, f"option_{option_number}"),
+                "description": description,
+                "option_number": option_number
+            }
+        return await execution.run_blocking(choose_and_describe)
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating description: {str(e)}") 
 
+@app.get("/processor/{processor_id}/option/{option_number}")
+async def get_enhancement_option(processor_id: str, option_number: int):
+    """Compute one enhancement option on first access and return it"""
+    img_processor = await execution.run_blocking(processors.get, processor_id)
+    if img_processor is None:
+        raise HTTPException(status_code=404, detail="Processor not found. Please enhance image first.")
+    if option_number not in (1, 2, 3):
+        raise HTTPException(status_code=400, detail="Invalid option number. Choose 1, 2, or 3.")
+    try:
+        await execution.run_blocking(img_processor.get_option, option_number)
+    except Exception as e:
+        print(f"Enhancement option {option_number} failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error computing option {option_number}: {str(e)}")
+
+    return {
+        "processor_id": processor_id,
+        "option_number": option_number,
+        "image_url": image_delivery.image_url(processor_id, f"option_{option_number}"),
+        "option2_engine": img_processor.option2_engine if option_number == 2 else None,
+        "option3_planner": img_processor.option3_plan_source if option_number == 3 else None
+    }
+
+@app.get("/processor/{processor_id}/image/{kind}")
+async def get_processor_image(processor_id: str, kind: str, request: Request):
+    """
+    One image of a processor as JPEG bytes with a strong ETag, so browsers can load
+    the images in parallel, cache them and revalidate with If-None-Match.
+    Options are computed on first access like /processor/{id}/option/{n}.
+    """
+    if kind not in image_delivery.IMAGE_KINDS:
+        raise HTTPException(status_code=404, detail=f"Unknown image kind. Choose one of: {', '.join(image_delivery.IMAGE_KINDS)}.")
+    img_processor = await execution.run_blocking(processors.get, processor_id)
+    if img_processor is None:
+        raise HTTPException(status_code=404, detail="Processor not found. Please enhance image first.")
+
+    def load_image():
+        if kind.startswith("option_"):
+            image = img_processor.get_option(int(kind[len("option_"):]))
+        else:
+            image = getattr(img_processor, image_delivery.IMAGE_KINDS[kind])
+        if image is None:
+            return None, None
+        return image_delivery.encoded_images.get(processor_id, kind, image)
+
+    try:
+        data, etag = await execution.run_blocking(load_image)
+    except Exception as e:
+        print(f"Could not load image {kind} of processor {processor_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error loading image {kind}: {str(e)}")
+    if data is None:
+        # e.g. the original upload, which is released once an option has been chosen
+        raise HTTPException(status_code=404, detail=f"Image {kind} is no longer available for this processor")
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={image_delivery.IMAGE_MAX_AGE_SECONDS}"
+    }
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type="image/jpeg", headers=headers)
+
 @app.delete("/cleanup/{processor_id}")
 async def cleanup_processor(processor_id: str):
     """Clean up processor instance to free memory"""
-    if processor_id in processors:
-        del processors[processor_id]
+    image_delivery.encoded_images.discard(processor_id)
+    if await execution.run_blocking(processors.remove, processor_id):
         return {"message": "Processor cleaned up successfully"}
     else:
         raise HTTPException(status_code=404, detail="Processor not found")
@@ -232,7 +547,28 @@ async def cleanup_processor(processor_id: str):
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "active_processors": len(processors)}
+    return {
+        "status": "healthy",
+        "active_processors": len(processors),
+        # Takes the store lock, which a lookup may hold while it reloads a spilled processor
+        "processor_store": await execution.run_blocking(processors.stats),
+        "enhancement_jobs": enhancement_jobs.jobs.stats(),
+        "execution": execution.stats(),
+        "encoded_images": image_delivery.encoded_images.stats(),
+        "detection_model": model_registry.registry.stats(),
+        "text_query_cache": object_detector.query_cache.stats(),
+        "detection_batcher": detection_batcher.batcher.stats(),
+        "rembg_sessions": rembg_session_pool.stats(),
+        "stage_cache": disk_cache.stage_cache.stats(),
+        "upscale_cache": disk_cache.upscale_cache.stats(),
+        "finegrain_clients": finegrain_client_pool.client_pool.stats(),
+        "local_upscaler": local_upscaler.upscaler.engine,
+        "enhancement_plan_cache": enhancement_plan_cache.plan_cache.stats(),
+        "option3_planner": {
+            "mode": enhancement_planner.OPTION3_PLANNER,
+            "fitted_local_model": enhancement_planner.local_planner.is_fitted()
+        }
+    }
 
 @app.post("/get_search_results")
 async def get_search_results(query:str):
@@ -240,7 +576,7 @@ async def get_search_results(query:str):
     try:
         print(f"Searching for: {query}")
         searcher = search_product()
-        results = searcher.search_products_google_cse(query, 5)
+        results = await execution.run_blocking(searcher.search_products_google_cse, query, 5)
         
         print(f"Found {len(results)} results")
         for i, result in enumerate(results):
@@ -263,7 +599,7 @@ async def generate_background(promptFromUser: str):
         from background_generator import BackgroundGenerator
         background_gen = BackgroundGenerator()
         print("Generating background image...")
-        result = background_gen.generate(prompt=promptFromUser)
+        result = await execution.run_blocking(background_gen.generate, prompt=promptFromUser)
         image_path = result.get("file_path")
         public_url = result.get("public_url")
         file_name = result.get("file_name")
@@ -276,7 +612,7 @@ async def generate_background(promptFromUser: str):
             if img.mode != 'RGB':
                 img = img.convert('RGB')
 
-            encoded_image = pil_image_to_base64(img)
+            encoded_image = await execution.run_blocking(pil_image_to_base64, img)
             if encoded_image is None:
                 raise HTTPException(status_code=500, detail="Error converting image to base64")
             return {"image": encoded_image
@@ -290,5 +626,7 @@ async def generate_background(promptFromUser: str):
         raise HTTPException(status_code=500, detail=f"Error generating background: {str(e)}")
     
 if __name__ == "__main__":
+    # Prefer `uvicorn rf_ai_api:app`: CPU workers spawned by execution.py re-import this
+    # script as __mp_main__ when it is the entry point, loading every model again
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8001)
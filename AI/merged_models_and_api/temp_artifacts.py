@@ -0,0 +1,57 @@
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+def _default_temp_dir():
+    # /dev/shm is RAM-backed on Linux, so artifacts that only exist to be uploaded never touch the disk
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return os.path.join("/dev/shm", "rf_ai_api")
+    return os.path.join(tempfile.gettempdir(), "rf_ai_api")
+
+
+TEMP_ARTIFACT_DIR = os.getenv("TEMP_ARTIFACT_DIR", _default_temp_dir())
+# Artifacts older than this were left behind by a crashed worker
+TEMP_ARTIFACT_MAX_AGE_SECONDS = float(os.getenv("TEMP_ARTIFACT_MAX_AGE_SECONDS", "3600"))
+
+
+@contextmanager
+def temp_artifact(data: bytes = None, suffix=".png", prefix="artifact-"):
+    """
+    Yields a unique file path for one request, optionally pre-filled with `data`,
+    and deletes the file when the block exits, even on errors.
+
+        with temp_artifacts.temp_artifact(png_bytes) as path:
+            upload(path)
+    """
+    os.makedirs(TEMP_ARTIFACT_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix=prefix, dir=TEMP_ARTIFACT_DIR)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if data is not None:
+                f.write(data)
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def cleanup_stale(max_age_seconds=TEMP_ARTIFACT_MAX_AGE_SECONDS) -> int:
+    """Removes leftovers older than max_age_seconds; returns how many files were deleted."""
+    removed = 0
+    cutoff = time.time() - max_age_seconds
+    try:
+        entries = list(os.scandir(TEMP_ARTIFACT_DIR))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
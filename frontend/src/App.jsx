@@ -40,6 +40,7 @@ function App() {
     handleDragLeave,
     handleDrop,
     handleEnhance,
+    cancelEnhancement,
     handleOptionSelect,
     resetApplication,
     handleDownload,
@@ -98,7 +99,7 @@ function App() {
 
         {/* Processing Stage */}
         {showProcessing && (
-          <ProcessingSection currentStep={currentStep} />
+          <ProcessingSection currentStep={currentStep} onCancel={cancelEnhancement} />
         )}
 
         {/* Selection Stage */}
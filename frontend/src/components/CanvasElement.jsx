@@ -38,6 +38,8 @@ const CanvasElement = ({ enhancedImageData, onClose }) => {
     useEffect(() => {
         if (enhancedImageData && !baseImageRef.current) {
             const img = new Image();
+            // Server images are cross-origin; without CORS they would taint the canvas
+            img.crossOrigin = 'anonymous';
             img.onload = () => {
                 baseImageRef.current = img;
                 
@@ -216,6 +218,7 @@ const CanvasElement = ({ enhancedImageData, onClose }) => {
         setTimeout(() => {
             if (enhancedImageData) {
                 const img = new Image();
+                img.crossOrigin = 'anonymous';
                 img.onload = () => {
                     baseImageRef.current = img;
                     
@@ -1,6 +1,6 @@
 import React from 'react';
 
-const ProcessingSection = ({ currentStep }) => {
+const ProcessingSection = ({ currentStep, onCancel }) => {
   const getStepStatus = (stepNumber) => {
     if (currentStep > stepNumber) return 'completed';
     if (currentStep === stepNumber) return 'active';
@@ -72,6 +72,11 @@ const ProcessingSection = ({ currentStep }) => {
               </div>
             </div>
           </div>
+          {onCancel && (
+            <button className="btn btn-secondary" onClick={onCancel}>
+              Cancel
+            </button>
+          )}
         </div>
       </div>
     </section>
@@ -42,6 +42,22 @@ const SelectionSection = ({ currentImages, onOptionSelect, isGeneratingDescripti
           {[1, 2, 3].map((option) => {
             const imageData = currentImages[`option${option}`];
             const { width, height } = imageData.dimensions;
+
+            // Options still running show a placeholder; the API returns no image for ones that failed or missed their deadline
+            if (!imageData.image) {
+              return (
+                <div key={option} className="option-card">
+                  <div className="option-label">Option {option}</div>
+                  <div className="option-info">
+                    {imageData.status === 'pending'
+                      ? <span><span className="spinner-small"></span> Still enhancing...</span>
+                      : imageData.status === 'failed'
+                        ? <span>⚠️ Enhancement failed</span>
+                        : <span>⏱️ Not ready in time</span>}
+                  </div>
+                </div>
+              );
+            }
             
             return (
               <div 
@@ -1,5 +1,5 @@
 import { useState, useRef, useEffect } from 'react';
-import { showAlert, delay, validateFile, downloadImage } from '../utils/helpers';
+import { showAlert, validateFile, downloadImage } from '../utils/helpers';
 import apiService from '../services/apiService';
 
 const sampleImage= 
@@ -10,8 +10,22 @@ const sampleImage=
     };
 
 
-// Helper function to get image dimensions from base64 data
-const getImageDimensions = (base64Data) => {
+// Processing step shown for each pipeline stage reported by the enhancement job
+const STAGE_STEPS = {
+  analyzing: 1,
+  detecting: 2,
+  removing_background: 2,
+  enhancing: 3
+};
+
+const createPendingOptions = () => ({
+  option1: { image: null, dimensions: { width: 0, height: 0 }, status: 'pending' },
+  option2: { image: null, dimensions: { width: 0, height: 0 }, status: 'pending' },
+  option3: { image: null, dimensions: { width: 0, height: 0 }, status: 'pending' }
+});
+
+// Helper function to get image dimensions from an image URL
+const getImageDimensions = (imageUrl) => {
   return new Promise((resolve) => {
     const img = new Image();
     img.onload = () => {
@@ -20,18 +34,14 @@ const getImageDimensions = (base64Data) => {
     img.onerror = () => {
       resolve({ width: 0, height: 0 });
     };
-    img.src = base64Data;
+    img.src = imageUrl;
   });
 };
 
 export const useImageEnhancerWithAPI = () => {
   const [currentImage, setCurrentImage] = useState(null);
   const [enhancedImageData, setEnhancedImageData] = useState(null);
-  const [enhancedImages, setEnhancedImages] = useState({
-    option1: { image: null, dimensions: { width: 0, height: 0 } },
-    option2: { image: null, dimensions: { width: 0, height: 0 } },
-    option3: { image: null, dimensions: { width: 0, height: 0 } }
-  });
+  const [enhancedImages, setEnhancedImages] = useState(createPendingOptions());
   const [isProcessing, setIsProcessing] = useState(false);
   const [showProcessing, setShowProcessing] = useState(false);
   const [showSelection, setShowSelection] = useState(false);
@@ -82,6 +92,14 @@ export const useImageEnhancerWithAPI = () => {
   }, []);
   
   const fileInputRef = useRef(null);
+  // Closes the progress stream of the running enhancement job, if any
+  const closeJobStreamRef = useRef(null);
+  // Read by the job event handlers, which would otherwise see the showFinal of the render that started the job
+  const showFinalRef = useRef(false);
+
+  useEffect(() => {
+    showFinalRef.current = showFinal;
+  }, [showFinal]);
 
   const handleFileSelect = (event) => {
     const file = event.target.files[0];
@@ -159,47 +177,64 @@ export const useImageEnhancerWithAPI = () => {
   };
 
   const enhanceImageWithAPI = async () => {
-    try {
-      // Step 1: Object Detection
-      setCurrentStep(1);
-      await delay(1000);
-      
-      // Step 2: Background Removal
-      setCurrentStep(2);
-      await delay(1000);
-      
-      // Step 3: Applying Enhancements
-      setCurrentStep(3);
-      
-      // Call your actual API
-      const response = await apiService.enhanceImage(uploadedImagePath, settings.background.background_base64);
-      
-      // Get dimensions for each enhanced image
-      const dimensions1 = await getImageDimensions(response.enhanced_image_1);
-      const dimensions2 = await getImageDimensions(response.enhanced_image_2);
-      const dimensions3 = await getImageDimensions(response.enhanced_image_3);
-      
-      // Store the enhanced images with their dimensions
-      setEnhancedImages({
-        option1: { image: response.enhanced_image_1, dimensions: dimensions1 },
-        option2: { image: response.enhanced_image_2, dimensions: dimensions2 },
-        option3: { image: response.enhanced_image_3, dimensions: dimensions3 }
+    setEnhancedImages(createPendingOptions());
+    setCurrentStep(1);
+
+    // The server answers with a job id right away and streams progress and each option as it finishes
+    const job = await apiService.startEnhancementJob(uploadedImagePath, settings.background.background_base64);
+
+    await new Promise((resolve, reject) => {
+      const closeStream = apiService.streamEnhancementJob(job.job_id, {
+        stage: ({ stage }) => {
+          setCurrentStep(STAGE_STEPS[stage] || 1);
+        },
+        option: async ({ option_number, status, image_url }) => {
+          // Only the URL is streamed; the browser fetches (and caches) the image itself
+          const image = apiService.imageUrl(image_url);
+          const dimensions = image ? await getImageDimensions(image) : { width: 0, height: 0 };
+          setEnhancedImages(prevImages => ({
+            ...prevImages,
+            [`option${option_number}`]: { image, dimensions, status }
+          }));
+          // Show the selection as soon as the first option is ready; the others fill in as they arrive
+          showSelectionStage();
+        },
+        completed: () => {
+          setCurrentStep(4);
+          showSelectionStage();
+          resolve();
+        },
+        cancelled: () => resolve(),
+        failed: ({ error }) => reject(new Error(error || 'Enhancement job failed')),
+        error: reject
       });
-      
-      // Step 4: Finalizing
-      setCurrentStep(4);
-      await delay(1000);
-      
-      // Show selection stage
-      showSelectionStage();
-      
-    } catch (error) {
-      console.error('Enhancement process failed:', error);
-      throw error;
+      // Closing the stream early (cancel/reset) also ends the wait
+      closeJobStreamRef.current = () => {
+        closeStream();
+        resolve();
+      };
+    }).finally(() => {
+      closeJobStreamRef.current = null;
+    });
+  };
+
+  const cancelEnhancement = async () => {
+    if (closeJobStreamRef.current) {
+      closeJobStreamRef.current();
+      closeJobStreamRef.current = null;
     }
+    await apiService.cancelEnhancementJob();
+    setIsProcessing(false);
+    setShowProcessing(false);
+    setShowSelection(false);
+    setCurrentStep(0);
   };
 
   const showSelectionStage = () => {
+    // Options that arrive after the user picked one only update the stored images
+    if (showFinalRef.current) {
+      return;
+    }
     setShowProcessing(false);
     setShowSelection(true);
     setIsProcessing(false);
@@ -215,6 +250,7 @@ export const useImageEnhancerWithAPI = () => {
 
       // Show final section immediately so loading state is visible
       setShowFinal(true);
+      showFinalRef.current = true;
       setShowSelection(false);
 
       if(settings.descriptionGeneration || settings.titleGeneration) {
@@ -262,13 +298,12 @@ export const useImageEnhancerWithAPI = () => {
   };
 
   const resetApplication = () => {
+    if (closeJobStreamRef.current) {
+      cancelEnhancement();
+    }
     setCurrentImage(null);
     setEnhancedImageData(null);
-    setEnhancedImages({
-      option1: null,
-      option2: null,
-      option3: null
-    });
+    setEnhancedImages(createPendingOptions());
     setIsProcessing(false);
     setShowProcessing(false);
     setShowSelection(false);
@@ -335,6 +370,7 @@ export const useImageEnhancerWithAPI = () => {
     handleDragLeave,
     handleDrop,
     handleEnhance,
+    cancelEnhancement,
     handleOptionSelect,
     resetApplication,
     handleDownload,
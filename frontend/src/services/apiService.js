@@ -5,6 +5,12 @@ class ApiService {
   constructor() {
     this.baseURL = API_BASE_URL;
     this.currentProcessorId = null;
+    this.currentJobId = null;
+  }
+
+  // Images are served from GET /processor/{id}/image/{kind}; responses carry paths relative to the API
+  imageUrl(path) {
+    return path ? `${this.baseURL}${path}` : null;
   }
 
   async uploadImage(imageFile) {
@@ -29,9 +35,9 @@ class ApiService {
     }
   }
 
-  async enhanceImage(imagePath, background = null) {
+  async startEnhancementJob(imagePath, background = null) {
     try {
-      const response = await fetch(`${this.baseURL}/enhance_and_return_all_options`, {
+      const response = await fetch(`${this.baseURL}/jobs/enhance`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -47,17 +53,61 @@ class ApiService {
       }
 
       const data = await response.json();
-      
-      // Store the processor ID for later use
+
+      // The processor ID is known up front; later calls use it once the job has produced images
       this.currentProcessorId = data.processor_id;
-      
+      this.currentJobId = data.job_id;
+
       return data;
     } catch (error) {
-      console.error('Error enhancing image:', error);
+      console.error('Error starting enhancement job:', error);
       throw error;
     }
   }
 
+  // Subscribes to a job's Server-Sent Events; handlers are keyed by event name
+  // (stage, images, option, completed, failed, cancelled). Returns a function that closes the stream.
+  streamEnhancementJob(jobId, handlers) {
+    const source = new EventSource(`${this.baseURL}/jobs/${jobId}/events`);
+    const terminalEvents = ['completed', 'failed', 'cancelled'];
+
+    ['queued', 'stage', 'images', 'option', ...terminalEvents].forEach((eventName) => {
+      source.addEventListener(eventName, (event) => {
+        const data = JSON.parse(event.data);
+        if (terminalEvents.includes(eventName)) {
+          source.close();
+        }
+        if (handlers[eventName]) {
+          handlers[eventName](data);
+        }
+      });
+    });
+
+    source.onerror = () => {
+      // EventSource reconnects on its own (resuming via Last-Event-ID) unless the stream was closed
+      if (source.readyState === EventSource.CLOSED && handlers.error) {
+        handlers.error(new Error('Lost connection to the enhancement job'));
+      }
+    };
+
+    return () => source.close();
+  }
+
+  async cancelEnhancementJob(jobId = this.currentJobId) {
+    try {
+      if (!jobId) {
+        return;
+      }
+
+      await fetch(`${this.baseURL}/jobs/${jobId}`, {
+        method: 'DELETE',
+      });
+    } catch (error) {
+      console.error('Error cancelling enhancement job:', error);
+      // Don't throw error for cancellation failures
+    }
+  }
+
   async chooseImageAndGenerateDescription(optionNumber) {
     try {
       if (!this.currentProcessorId) {
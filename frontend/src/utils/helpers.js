@@ -75,6 +75,8 @@ export const downloadImage = (imageData, filename) => {
   const canvas = document.createElement('canvas');
   const ctx = canvas.getContext('2d');
   const img = new Image();
+  // Server image URLs are cross-origin; CORS keeps the canvas exportable
+  img.crossOrigin = 'anonymous';
   
   img.onload = function() {
     canvas.width = img.width;